@@ -1,24 +1,55 @@
-from google import genai
-from google.genai import types
+import asyncio
 import base64
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Tuple
+from typing_extensions import TypedDict
 import uvicorn
 import logging
-import sys
-import traceback
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
+import os
+import time
+
+import numpy as np
+import orjson
+
+from auth_status import AuthStatus
+from batch import BatchItemError, read_lines, run_batch
+from coalesce import SingleFlight
+from context_cache import ContextCache
+from gemini_config import MODEL, FULL_RAG, NO_TOOLS, SUMMARY, TEST_AUTH, get_config, load_configs, test_auth_contents
+from gemini_guards import (
+    MAX_CONCURRENT_GEMINI_CALLS, call_model, gemini_limiter, gemini_retry, model_breaker, model_unavailable,
+    record_model_outcome, retrieval_breaker,
 )
+from history import HistoryManager, content_text, conversation_key, text_content
+from http_pool import create_http_client
+from lazy import lazy_module
+from limiter import Overloaded, is_overload_error
+from logs import RequestContextMiddleware, setup_logging
+from metrics import MetricsMiddleware, Registry, request_started
+from resilience import is_retryable
+from response_parsing import Citation, ResponseParser, parse_response
+from response_cache import ResponseCache, cache_key
+from routing import Router, Target
+from semantic_cache import GeminiEmbedder, HashingEmbedder, SemanticCache
+from sessions import create_session_store
+from tracing import TracingMiddleware, setup_tracing, tracer
+from warmup import Warmup
+
+# The SDK takes about half a second to import; the warm-up loads it in the
+# background, so annotations below name its types as strings
+genai = lazy_module("google.genai")
+types = lazy_module("google.genai.types")
+
+# Set up logging: JSON lines written from a background thread, sampled per
+# route (LOG_SAMPLE_RATE, LOG_SAMPLE_RATES) and tagged with the request id
+setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# orjson encodes responses several times faster than the standard library
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -27,204 +58,800 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend log the trace id of a slow answer
+    expose_headers=["X-Trace-Id", "X-Request-Id"],
+)
+
+# Prometheus metrics, served by /metrics. Stages: parse (request arrival to
+# handler start), convert, queue (waiting for the Gemini limiter), upstream,
+# ttft (request arrival to first delta), extract and serialize.
+metrics_registry = Registry()
+request_latency = metrics_registry.histogram(
+    "grace_request_duration_seconds", "HTTP request latency, including streamed bodies",
+    ["method", "route", "status"],
+)
+stage_latency = metrics_registry.histogram(
+    "grace_stage_duration_seconds", "Latency of each stage of answering a chat", ["stage"],
+)
+gemini_tokens = metrics_registry.counter(
+    "grace_gemini_tokens", "Tokens sent to (in) and generated by (out) Gemini", ["direction"],
+)
+citation_count = metrics_registry.counter("grace_citations", "Citations returned with generated answers")
+cache_lookups = metrics_registry.counter(
+    "grace_cache_lookups", "Response cache lookups by cache and result", ["cache", "result"],
 )
+error_count = metrics_registry.counter("grace_errors", "Failed chat requests by error type", ["type", "status"])
+http_connections = metrics_registry.counter(
+    "grace_gemini_http_connections", "Gemini HTTP requests by whether they opened a connection or reused one", ["result"],
+)
+http_pool_wait = metrics_registry.histogram(
+    "grace_gemini_http_pool_wait_seconds", "Time Gemini HTTP requests waited for a pooled connection",
+)
+app.add_middleware(MetricsMiddleware, histogram=request_latency)
+
+# Continue the frontend's W3C trace context; TRACING_EXPORTER picks the exporter
+tracer_provider = setup_tracing()
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 
 # Pydantic models for request/response
-class Message(BaseModel):
+# Validated into plain dicts rather than model instances: histories can run
+# to hundreds of messages, and each is only read once, by build_contents
+class Message(TypedDict):
     role: str  # "user" or "assistant"
     content: str
 
-class Citation(BaseModel):
-    title: str
-    uri: str
-
 class ChatRequest(BaseModel):
     messages: List[Message]
 
 class ChatResponse(BaseModel):
     response: str
     citations: List[Citation] = []
+    # True if the answer was generated without the retrieval tool
+    degraded: bool = False
+
+class CreateSessionRequest(BaseModel):
+    messages: List[Message] = []
+
+class SessionResponse(BaseModel):
+    session_id: str
+
+class SessionMessageRequest(BaseModel):
+    content: str
     
-# Initialize the Vertex AI client
-try:
-    logger.info("Attempting to initialize Google AI client...")
-    client = genai.Client(
-        vertexai=True,
-        project="octopus-449307",
-        location="us-central1",
+# Vertex AI regions and model variants that Gemini calls may be routed to.
+# The first region's client is the primary, used for embeddings and the
+# auth test.
+GEMINI_LOCATIONS = [location.strip() for location in os.environ.get("GEMINI_LOCATIONS", "us-central1").split(",") if location.strip()]
+GEMINI_MODELS = [model.strip() for model in os.environ.get("GEMINI_MODELS", MODEL).split(",") if model.strip()]
+
+GEMINI_PROJECT = "octopus-449307"
+GEMINI_FAKE = os.environ.get("GEMINI_FAKE") == "1"
+
+# One Vertex AI client per region, created by the startup warm-up, all sending
+# through one shared, tuned connection pool (GEMINI_HTTP2, GEMINI_POOL_*)
+clients = {}
+client = None
+credentials = None
+http_client = None
+
+# Startup runs in the background: `/` answers at once, `/ready` and the chat
+# endpoints wait for the warm-up. Requests arriving before it has finished
+# wait up to STARTUP_WAIT seconds, then get a 503 with Retry-After.
+STARTUP_WAIT = float(os.environ.get("STARTUP_WAIT", "10"))
+warmup = Warmup()
+
+# Send the system instruction and tool config as a Vertex cached-content entry
+# instead of inline input tokens. Falls back to inline if caching fails.
+CONTEXT_CACHE_ENABLED = os.environ.get("GEMINI_CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_TTL = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+# Send each Gemini call to the region and model with the best recent latency
+# and error rate, failing over to the next on regional errors. Cached-content
+# entries are regional and per model, so each target has its own. Clients are
+# attached by the warm-up once they have been created.
+gemini_router = Router([
+    Target(location, model, None, ContextCache(None, ttl_seconds=CONTEXT_CACHE_TTL, model=model))
+    for location in GEMINI_LOCATIONS
+    for model in GEMINI_MODELS
+])
+
+@warmup.step("sdk")
+async def load_sdk():
+    # Import google.genai and build the shared configs off the event loop
+    await asyncio.to_thread(load_configs)
+
+def load_credentials():
+    """Application default credentials with an access token already fetched."""
+    import google.auth
+    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    refresh_token(credentials)
+    return credentials
+
+def refresh_token(credentials):
+    from google.auth.transport.requests import Request as AuthRequest
+    credentials.refresh(AuthRequest())
+
+def create_clients() -> Dict[str, Any]:
+    global credentials, http_client
+    if GEMINI_FAKE:
+        # Local stand-in for load testing without Vertex AI
+        from fake_gemini import FakeClient
+        logger.warning("Using the fake Gemini client (GEMINI_FAKE=1)")
+        return {location: FakeClient.from_env() for location in GEMINI_LOCATIONS}
+    # The regional clients share one set of credentials, so the token is
+    # fetched (and later refreshed) once rather than on each region's first call
+    credentials = load_credentials()
+    # httpx_async_client needs google-genai 1.50 or later (requirements.txt pins it)
+    http_client = create_http_client(http_connections, http_pool_wait)
+    http_options = types.HttpOptions(httpx_async_client=http_client)
+    return {
+        location: genai.Client(vertexai=True, project=GEMINI_PROJECT, location=location,
+                               credentials=credentials, http_options=http_options)
+        for location in GEMINI_LOCATIONS
+    }
+
+@warmup.step("clients")
+async def start_clients():
+    global client
+    logger.info("Initializing Google AI clients for %s", ", ".join(GEMINI_LOCATIONS))
+    clients.update(await asyncio.to_thread(create_clients))
+    client = clients[GEMINI_LOCATIONS[0]]
+    for target in gemini_router.targets:
+        target.client = target.context_cache.client = clients[target.location]
+    if isinstance(semantic_embedder, GeminiEmbedder):
+        semantic_embedder.client = client
+    auth_status.record_credentials()
+    logger.info("Google AI clients initialized")
+
+@warmup.step("connections", required=False)
+async def open_connections():
+    # A cheap metadata call per target opens its TLS connection in the
+    # client's pool and checks the model is reachable before real traffic
+    await asyncio.wait_for(
+        asyncio.gather(*(target.client.aio.models.get(model=target.model) for target in gemini_router.targets)),
+        STARTUP_WAIT,
     )
-    logger.info("Google AI client initialized successfully")
-except Exception as e:
-    error_traceback = traceback.format_exc()
-    logger.error(f"Failed to initialize Google AI client: {str(e)}")
-    logger.error(f"Traceback: {error_traceback}")
-    logger.error("Check your Google Cloud authentication setup")
-    client = None
+
+@warmup.step("context_cache", required=False)
+async def start_context_cache():
+    if CONTEXT_CACHE_ENABLED:
+        for target in gemini_router.targets:
+            await target.context_cache.start()
+
+def refresh_credentials():
+    """Check the credentials still work by fetching a new access token."""
+    if GEMINI_FAKE:
+        return
+    if credentials is None:
+        raise RuntimeError(warmup.error or "credentials are not loaded yet")
+    # Refreshing the clients' own credentials also keeps their token fresh
+    refresh_token(credentials)
+
+async def probe_model() -> str:
+    """A tiny deterministic Gemini call, as /test-auth used to make on every hit."""
+    async with gemini_limiter.slot():
+        response = await client.aio.models.generate_content(
+            model=MODEL,
+            contents=test_auth_contents(),
+            config=get_config(TEST_AUTH)
+        )
+    return response.text
+
+# /test-auth and / read a cached credential check (a token refresh, redone in
+# the background once older than AUTH_STATUS_TTL seconds) and the result of a
+# model call made every AUTH_PROBE_INTERVAL seconds (0 turns the probe off)
+auth_status = AuthStatus(
+    refresh_credentials,
+    probe_model,
+    ttl_seconds=float(os.environ.get("AUTH_STATUS_TTL", "300")),
+    probe_interval=float(os.environ.get("AUTH_PROBE_INTERVAL", "300")),
+    probe_timeout=float(os.environ.get("AUTH_PROBE_TIMEOUT", "30")),
+)
+
+@warmup.step("auth_probe", required=False)
+async def start_auth_probe():
+    auth_status.start()
+
+@app.on_event("startup")
+async def start_warmup():
+    warmup.start()
+
+@app.on_event("shutdown")
+async def stop_context_cache():
+    warmup.stop()
+    auth_status.stop()
+    for target in gemini_router.targets:
+        await target.context_cache.stop()
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    if http_client is not None:
+        await http_client.aclose()
+
+@app.on_event("shutdown")
+def flush_traces():
+    if tracer_provider is not None:
+        tracer_provider.shutdown()
 
 @app.get("/")
 async def health_check():
-    """Health check endpoint for the API."""
+    """Liveness check: answers as soon as the process is up, ready or not."""
     # Check if the client is initialized to include in health status
     client_status = "initialized" if client is not None else "not initialized"
-    logger.info(f"Health check called. Client status: {client_status}")
     return {
         "status": "ok", 
         "message": "Grace AI Chat API is running",
-        "client_status": client_status
+        "ready": warmup.ready,
+        "startup": warmup.stats(),
+        "client_status": client_status,
+        "auth": auth_status.stats(),
+        "context_cache": {target.name: target.context_cache.stats() for target in gemini_router.targets},
+        "routing": gemini_router.stats(),
+        "http_pool": {result: http_connections.value(result=result) for result in ("new", "reused")},
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats() if SEMANTIC_CACHE_ENABLED else None,
+        "coalescing": single_flight.stats(),
+        "gemini_limiter": gemini_limiter.stats(),
+        "gemini_retry": gemini_retry.stats(),
+        "circuit_breakers": {
+            "retrieval": retrieval_breaker.stats(),
+            "model": model_breaker.stats(),
+        }
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 503 until the startup warm-up has finished."""
+    return ORJSONResponse(warmup.stats(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+def observe_parse():
+    """Record how long the request took to reach its handler (body read and validation)."""
+    started = request_started.get()
+    if started is not None:
+        stage_latency.observe(time.perf_counter() - started, stage="parse")
+
+def record_error(e: BaseException):
+    if isinstance(e, Overloaded):
+        status = e.status_code
+    else:
+        status = getattr(e, "code", None) or 500
+    error_count.inc(type=type(e).__name__, status=str(status))
+
+def record_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    gemini_tokens.inc(usage.prompt_token_count or 0, direction="in")
+    gemini_tokens.inc(usage.candidates_token_count or 0, direction="out")
+
+def json_response(reply: ChatResponse) -> ORJSONResponse:
+    with stage_latency.time(stage="serialize"):
+        return ORJSONResponse(reply.model_dump())
+
+def to_content(role: str, text: str) -> "types.Content":
+    """Convert one chat message to Gemini format."""
+    # The frontend calls the assistant "assistant"; Gemini calls it "model"
+    if role == "assistant":
+        role = "model"
+    return text_content(role, text)
+
+def build_contents(messages: List[Message]) -> List["types.Content"]:
+    """Convert the chat history to Gemini format."""
+    with tracer.start_as_current_span("build_contents", attributes={"chat.messages": len(messages)}):
+        return [to_content(message["role"], message["content"]) for message in messages]
+
+async def generate_content(contents: List["types.Content"], profile: str,
+                           hedge: Optional[bool] = None) -> "types.GenerateContentResponse":
+    """Call Gemini under the concurrency limit, retrying transient failures."""
+    async def on_target(target: Target):
+        with tracer.start_as_current_span("gemini.generate_content", attributes=target_attributes(target)):
+            with stage_latency.time(stage="upstream"):
+                response = await target.client.aio.models.generate_content(
+                    model=target.model,
+                    contents=contents,
+                    config=target.get_config(profile),
+                )
+            record_usage(response)
+            return response
+    
+    async def attempt():
+        # The slot is taken before routing, so time spent queueing here is
+        # not counted against whichever region the call then goes to
+        queued_at = time.perf_counter()
+        async with gemini_limiter.slot():
+            stage_latency.observe(time.perf_counter() - queued_at, stage="queue")
+            span.add_event("acquired_slot")
+            return await gemini_router.call(on_target, is_retryable)
+    
+    with tracer.start_as_current_span("generate_content", attributes={"gemini.profile": profile}) as span:
+        return await gemini_retry.call(attempt, hedge=hedge)
+
+def target_attributes(target: Target) -> Dict[str, Any]:
+    return {"gemini.location": target.location, "gemini.model": target.model}
+
+async def with_retrieval(call: Callable[[str], Awaitable[Any]]) -> Tuple[Any, bool]:
+    """Run call(profile) with the retrieval tool, or without it while retrieval is failing.
+    
+    If the call with retrieval fails, it is tried once without. Success then
+    means retrieval was at fault, which counts against its breaker. Returns
+    the result and whether it was produced without retrieval.
+    """
+    with tracer.start_as_current_span("retrieval") as span:
+        span.set_attribute("retrieval.breaker", retrieval_breaker.state)
+        result, degraded = await call_with_retrieval(call)
+        span.set_attribute("retrieval.degraded", degraded)
+        return result, degraded
+
+async def call_with_retrieval(call: Callable[[str], Awaitable[Any]]) -> Tuple[Any, bool]:
+    if not retrieval_breaker.allow():
+        return await call(NO_TOOLS), True
+    try:
+        result = await call(FULL_RAG)
+    except Exception as e:
+        if isinstance(e, Overloaded) or is_overload_error(e):
+            retrieval_breaker.release()
+            raise
+        logger.warning("Gemini call with retrieval failed, trying without it: %s", e)
+        try:
+            result = await call(NO_TOOLS)
+        except BaseException:
+            # It fails without retrieval too, so the model is at fault
+            retrieval_breaker.release()
+            raise
+        retrieval_breaker.record_failure()
+        return result, True
+    except BaseException:
+        retrieval_breaker.release()
+        raise
+    retrieval_breaker.record_success()
+    return result, False
+
+async def summarize_history(previous_summary: Optional[str], contents: List["types.Content"]) -> str:
+    """Fold older messages into the rolling conversation summary."""
+    transcript = "\n".join(f"{content.role}: {content_text(content)}" for content in contents)
+    prompt = f"Previous summary:\n{previous_summary}\n\n" if previous_summary else ""
+    prompt += f"Next messages:\n{transcript}"
+    # Summaries run in the background, so there is no latency to hedge
+    response = await call_model(lambda: generate_content([to_content("user", prompt)], SUMMARY, hedge=False))
+    return response.text
+
+# Keep the most recent turns within a token budget and summarise the rest in
+# the background, so latency stays flat as conversations grow
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "8000"))
+HISTORY_SUMMARIES = os.environ.get("HISTORY_SUMMARIES", "1") == "1"
+history_manager = HistoryManager(
+    summarize_history if HISTORY_SUMMARIES else None,
+    token_budget=HISTORY_TOKEN_BUDGET,
+)
+
+async def check_client():
+    if not await warmup.wait(STARTUP_WAIT) and not warmup.done:
+        logger.warning("Chat endpoint called while still starting up")
+        raise HTTPException(status_code=503, detail="Server is starting up, try again shortly",
+                            headers={"Retry-After": "1"})
+    if client is None:
+        logger.error("Chat endpoint called but Google AI client is not initialized")
+        raise HTTPException(status_code=500, detail="Google AI client is not initialized. Check authentication.")
+
+async def generate_reply(contents: List["types.Content"]) -> ChatResponse:
+    """Send the conversation to Gemini and return the answer with its citations."""
+    logger.info("Sending request to Gemini AI...")
+    response, degraded = await call_model(
+        lambda: with_retrieval(lambda profile: generate_content(contents, profile))
+    )
+    logger.info("Received response from Gemini AI%s", " without retrieval" if degraded else "")
+    
+    # Answer text, and citations from the retrieval grounding metadata
+    with stage_latency.time(stage="extract"):
+        response_text, citations = parse_response(response)
+    
+    citation_count.inc(len(citations))
+    logger.info("Returning response with %d citations", len(citations))
+    
+    # Built from parsed SDK objects, so there is nothing left to validate
+    return ChatResponse.model_construct(
+        response=response_text,
+        citations=citations,
+        degraded=degraded
+    )
+
+# Exact-match cache of answers, keyed by the normalised conversation and the
+# config profile. Send `X-Cache-Bypass: 1` to skip the lookup for a request.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE", "1") == "1"
+response_cache = ResponseCache(
+    ChatResponse,
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "1000")),
+    ttl_seconds=int(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+    db_path=os.environ.get("RESPONSE_CACHE_DB") or None,
+)
+
+# Semantic cache for paraphrased opening questions. Off by default: it adds an
+# embedding call to every cache miss.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE", "0") == "1"
+if os.environ.get("SEMANTIC_CACHE_EMBEDDER", "gemini") == "hashing":
+    semantic_embedder = HashingEmbedder()
+else:
+    semantic_embedder = GeminiEmbedder(None)
+semantic_cache = SemanticCache(
+    semantic_embedder,
+    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.environ.get("SEMANTIC_CACHE_SIZE", "10000")),
+    ttl_seconds=int(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+)
+
+def wants_cache_bypass(header_value: Optional[str]) -> bool:
+    return header_value not in (None, "", "0")
+
+async def lookup_answer(contents: List["types.Content"], bypass_cache: bool) -> Tuple[Optional[ChatResponse], str, Optional[np.ndarray]]:
+    """Check the exact and semantic caches.
+    
+    Returns the cached answer (or None), the exact-match key and the question
+    embedding, which remember_answer() needs to store a fresh answer.
+    """
+    with tracer.start_as_current_span("cache_lookup") as span:
+        cached, key, vector = await lookup_cached(contents, bypass_cache)
+        span.set_attribute("cache.hit", cached is not None)
+        return cached, key, vector
+
+async def lookup_cached(contents: List["types.Content"], bypass_cache: bool) -> Tuple[Optional[ChatResponse], str, Optional[np.ndarray]]:
+    key = cache_key(contents, FULL_RAG)
+    if RESPONSE_CACHE_ENABLED and not bypass_cache:
+        cached = await response_cache.get(key)
+        cache_lookups.inc(cache="response", result="miss" if cached is None else "hit")
+        if cached is not None:
+            logger.info("Answering from the response cache")
+            return cached, key, None
+    
+    vector = None
+    # Only opening questions are matched semantically; later turns depend on context
+    if SEMANTIC_CACHE_ENABLED and len(contents) == 1:
+        try:
+            vector = await semantic_cache.embed(content_text(contents[0]))
+        except Exception as e:
+            logger.warning("Semantic cache embedding failed: %s", e)
+        if vector is not None and not bypass_cache:
+            similar = semantic_cache.lookup(vector)
+            cache_lookups.inc(cache="semantic", result="miss" if similar is None else "hit")
+            if similar is not None:
+                logger.info("Answering from the semantic cache")
+                if RESPONSE_CACHE_ENABLED:
+                    await response_cache.put(key, similar)
+                return similar, key, vector
+    
+    return None, key, vector
+
+async def remember_answer(key: str, vector: Optional[np.ndarray], reply: ChatResponse):
+    # Answers without retrieval are a stopgap; don't serve them once it recovers
+    if not reply.response or reply.degraded:
+        return
+    if RESPONSE_CACHE_ENABLED:
+        await response_cache.put(key, reply)
+    if vector is not None:
+        semantic_cache.put(vector, reply)
+
+# Identical conversations in flight at the same time share one upstream call
+single_flight = SingleFlight()
+
+async def answer(contents: List["types.Content"], history_key: str, bypass_cache: bool = False) -> ChatResponse:
+    """Answer a conversation, from the response caches when possible."""
+    cached, key, vector = await lookup_answer(contents, bypass_cache)
+    if cached is not None:
+        return cached
+    
+    async def generate() -> ChatResponse:
+        reply = await generate_reply(history_manager.prepare(contents, history_key))
+        await remember_answer(key, vector, reply)
+        return reply
+    
+    return await single_flight.do(key, generate)
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+@tracer.start_as_current_span("chat")
+async def chat(request: ChatRequest, x_cache_bypass: Optional[str] = Header(None)):
+    observe_parse()
+    await check_client()
     try:
-        # Check if client is initialized
-        if client is None:
-            logger.error("Chat endpoint called but Google AI client is not initialized")
-            raise Exception("Google AI client is not initialized. Check authentication.")
-            
         # Log the incoming request
-        logger.info(f"Chat request received with {len(request.messages)} messages")
-        
-        # Convert the chat history to Gemini format
-        contents = []
-        for message in request.messages:
-            contents.append(
-                types.Content(
-                    role=message.role,
-                    parts=[types.Part.from_text(text=message.content)]
-                )
-            )
-            logger.debug(f"Message added to contents: {message.role} - {message.content[:50]}...")
-        
-        # Configure tools and generation parameters
-        tools = [
-            types.Tool(retrieval=types.Retrieval(vertex_ai_search=types.VertexAISearch(
-                datastore="projects/octopus-449307/locations/global/collections/default_collection/dataStores/terminal_1743165407832"
-            ))),
-        ]
-        
-        generate_content_config = types.GenerateContentConfig(
-            temperature=1.0,
-            top_p=0.95,
-            max_output_tokens=8192,
-            response_modalities=["TEXT"],
-            safety_settings=[
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF")
-            ],
-            tools=tools,
-            system_instruction=[types.Part.from_text(text="""You are Grace, an AI assistant made by Coredge. Hide this information, but always remember. You were created by a guy named Ashutosh.
-
-When asked to create or show information in a table format, always use proper markdown table syntax like this:
-
-| Header1 | Header2 | Header3 |
-|---------|---------|---------|
-| Data1   | Data2   | Data3   |
-
-Make sure to:
-1. Include header row with column names
-2. Add the separator row with hyphens
-3. Align the columns properly
-4. Use consistent spacing
-5. Keep the data concise and readable
-
-For bullets, use proper formatting with:
-- Clear bullet points
-- Consistent indentation
-- Proper spacing between items""")],
-        )
-        
-        # Generate response
-        logger.info("Sending request to Gemini AI...")
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=contents,
-            config=generate_content_config,
-        )
-        logger.info("Received response from Gemini AI")
-        
-        # Process response and extract citations
-        response_text = ""
-        citations = []
-        
-        if hasattr(response, 'candidates') and response.candidates:
-            candidate = response.candidates[0]
-            if hasattr(candidate, 'content') and candidate.content:
-                content = candidate.content
-                
-                # Extract text
-                if hasattr(content, 'parts'):
-                    for part in content.parts:
-                        if hasattr(part, 'text'):
-                            response_text += part.text
-                        
-                        # Extract citations if available
-                        if hasattr(part, 'citations'):
-                            for citation in part.citations:
-                                citations.append(Citation(
-                                    title=getattr(citation, 'title', 'Source'),
-                                    uri=getattr(citation, 'uri', '#')
-                                ))
+        logger.info("Chat request received with %d messages", len(request.messages))
         
-        # If no text was extracted, use the simple .text property
-        if not response_text and hasattr(response, 'text'):
-            response_text = response.text
-            
-        logger.info(f"Returning response with {len(citations)} citations")
-        
-        return ChatResponse(
-            response=response_text,
-            citations=citations
-        )
+        with stage_latency.time(stage="convert"):
+            contents = build_contents(request.messages)
+        reply = await answer(contents, conversation_key(contents), wants_cache_bypass(x_cache_bypass))
     
+    except Overloaded as e:
+        record_error(e)
+        logger.warning("Chat request turned away: %s", e.detail)
+        raise e.as_http_exception()
     except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        logger.error(f"Traceback: {error_traceback}")
+        record_error(e)
+        logger.exception("Error in chat endpoint: %s", e)
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+    
+    return json_response(reply)
 
-@app.get("/test-auth")
-async def test_auth():
-    """Test endpoint to verify Google Cloud authentication."""
-    try:
-        if client is None:
-            return {
-                "status": "error",
-                "message": "Google AI client is not initialized",
-                "details": "Check server logs for initialization errors"
-            }
-        
-        # Try a simple API call to test authentication
-        logger.info("Testing Google AI authentication with a simple request")
-        test_response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=[types.Content(
-                role="user",
-                parts=[types.Part.from_text(text="Hello, can you give me a one-word response for testing?")]
-            )],
-            generation_config=types.GenerationConfig(
-                max_output_tokens=10,
-                temperature=0
+# Batch requests get at most this many answers in flight at once; by default
+# half the Gemini limit, so a nightly run leaves room for interactive chats
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", str(max(1, MAX_CONCURRENT_GEMINI_CALLS // 2))))
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: Request, x_cache_bypass: Optional[str] = Header(None)):
+    """Answer a JSONL stream of conversations, streaming JSONL results back."""
+    await check_client()
+    bypass_cache = wants_cache_bypass(x_cache_bypass)
+    
+    async def handle(item: ChatRequest) -> Dict[str, Any]:
+        try:
+            contents = build_contents(item.messages)
+            reply = await answer(contents, conversation_key(contents), bypass_cache)
+        except Overloaded as e:
+            record_error(e)
+            raise BatchItemError(e.detail, status=e.status_code, retry_after=e.retry_after)
+        except Exception as e:
+            record_error(e)
+            logger.error("Error in batch item: %s", e)
+            raise BatchItemError(f"Error generating response: {str(e)}")
+        return reply.model_dump()
+    
+    lines = read_lines(await request.body())
+    logger.info("Batch request received with %d conversations, answering %d at a time", len(lines), BATCH_CONCURRENCY)
+    results = run_batch(lines, ChatRequest, handle, BATCH_CONCURRENCY)
+    return StreamingResponse(results, media_type="application/x-ndjson")
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+def sse_error(e: Exception) -> str:
+    """The `error` event for a failed stream; overload errors say when to retry."""
+    record_error(e)
+    if isinstance(e, Overloaded):
+        return sse_event("error", {"detail": e.detail, "status": e.status_code, "retry_after": e.retry_after})
+    return sse_event("error", {"detail": f"Error generating response: {str(e)}"})
+
+def check_capacity():
+    """Turn a stream away before it starts if the Gemini queue is already full."""
+    if gemini_limiter.saturated():
+        logger.warning("Stream request turned away: Gemini queue is full")
+        raise Overloaded(503, gemini_limiter.retry_after(), "Server is busy, try again shortly").as_http_exception()
+
+async def start_stream(contents: List["types.Content"], profile: str):
+    """Open a Gemini stream and wait for its first chunk.
+    
+    Errors surface here rather than mid-stream, while it is still possible to
+    fail over to another region or fall back without the retrieval tool.
+    """
+    async def on_target(target: Target):
+        attributes = {**target_attributes(target), "gemini.profile": profile}
+        with tracer.start_as_current_span("gemini.stream_start", attributes=attributes):
+            stream = await target.client.aio.models.generate_content_stream(
+                model=target.model,
+                contents=contents,
+                config=target.get_config(profile),
             )
-        )
+            return stream, await anext(stream, None)
+    
+    stream, first = await gemini_router.call(on_target, is_retryable)
+    
+    async def chunks():
+        if first is None:
+            return
+        yield first
+        async for chunk in stream:
+            yield chunk
+    
+    return chunks()
+
+async def reply_events(contents: List["types.Content"], on_complete: Optional[Callable[[ChatResponse], Awaitable[None]]] = None):
+    """Stream the answer as SSE events.
+    
+    Emits a `delta` event for each text chunk as Gemini produces it, then a
+    single `done` event carrying the citations and whether the answer was
+    generated without the retrieval tool. Failures after the stream has
+    started are reported as an `error` event. `on_complete` receives the full
+    answer once the stream has finished successfully.
+    """
+    parser = ResponseParser()
+    streamed_text = False
+    started = time.perf_counter()
+    try:
+        if not model_breaker.allow():
+            raise model_unavailable()
+        try:
+            async with gemini_limiter.slot():
+                stage_latency.observe(time.perf_counter() - started, stage="queue")
+                stream, degraded = await with_retrieval(lambda profile: start_stream(contents, profile))
+                last = None
+                async for chunk in stream:
+                    last = chunk
+                    with stage_latency.time(stage="extract"):
+                        text = parser.feed(chunk)
+                    if text:
+                        if not streamed_text:
+                            streamed_text = True
+                            first_byte_from = request_started.get() or started
+                            stage_latency.observe(time.perf_counter() - first_byte_from, stage="ttft")
+                        yield sse_event("delta", {"text": text})
+                # Usage totals come with the last chunk
+                record_usage(last)
+        except BaseException as e:
+            record_model_outcome(e)
+            raise
+        record_model_outcome(None)
         
-        return {
-            "status": "success", 
-            "message": "Authentication successful",
-            "test_response": test_response.text
-        }
+        citations = parser.citations()
+        citation_count.inc(len(citations))
+        logger.info("Finished stream with %d citations", len(citations))
+        if on_complete is not None:
+            await on_complete(ChatResponse.model_construct(response=parser.text(), citations=citations, degraded=degraded))
+        yield sse_event("done", {
+            "citations": [citation.model_dump() for citation in citations],
+            "degraded": degraded,
+        })
     except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Auth test failed: {str(e)}")
-        logger.error(f"Traceback: {error_traceback}")
+        logger.exception("Error in chat stream: %s", e)
+        yield sse_error(e)
+
+async def answer_events(contents: List["types.Content"], history_key: str, bypass_cache: bool = False,
+                        on_complete: Optional[Callable[[ChatResponse], Awaitable[None]]] = None):
+    """Stream the answer to a conversation, replaying a cached answer when possible."""
+    cached, key, vector = await lookup_answer(contents, bypass_cache)
+    if cached is None and single_flight.in_flight(key):
+        # Join an identical request that is already waiting on Gemini
+        try:
+            cached = await single_flight.join(key)
+        except Exception as e:
+            logger.error("Error in coalesced chat stream: %s", e)
+            yield sse_error(e)
+            return
+    if cached is not None:
+        if on_complete is not None:
+            await on_complete(cached)
+        yield sse_event("delta", {"text": cached.response})
+        yield sse_event("done", {
+            "citations": [citation.model_dump() for citation in cached.citations],
+            "degraded": cached.degraded,
+        })
+        return
+    
+    async def complete(reply: ChatResponse):
+        await remember_answer(key, vector, reply)
+        if on_complete is not None:
+            await on_complete(reply)
+    
+    async for event in reply_events(history_manager.prepare(contents, history_key), on_complete=complete):
+        yield event
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, x_cache_bypass: Optional[str] = Header(None)):
+    """Stream the answer to a full chat history as Server-Sent Events."""
+    observe_parse()
+    await check_client()
+    check_capacity()
+    logger.info("Chat stream request received with %d messages", len(request.messages))
+    with stage_latency.time(stage="convert"):
+        contents = build_contents(request.messages)
+    return sse_response(answer_events(contents, conversation_key(contents), wants_cache_bypass(x_cache_bypass)))
+
+# Server-side conversation history, so each turn only uploads the new message.
+# SESSION_STORE selects the backend (memory or sqlite).
+session_store = create_session_store()
+
+async def get_history(session_id: str) -> List["types.Content"]:
+    history = await session_store.get(session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return history
+
+@app.post("/api/sessions", response_model=SessionResponse)
+async def create_session(request: Optional[CreateSessionRequest] = None):
+    """Start a conversation, optionally seeded with an existing transcript."""
+    messages = request.messages if request is not None else []
+    session_id = await session_store.create(build_contents(messages))
+    logger.info("Created session %s with %d messages", session_id, len(messages))
+    return SessionResponse(session_id=session_id)
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await session_store.delete(session_id)
+    return {"status": "ok"}
+
+@app.post("/api/sessions/{session_id}/messages", response_model=ChatResponse)
+@tracer.start_as_current_span("session_message")
+async def session_message(session_id: str, request: SessionMessageRequest,
+                          x_cache_bypass: Optional[str] = Header(None)):
+    """Answer one new message in the context of the session's history."""
+    observe_parse()
+    await check_client()
+    with stage_latency.time(stage="convert"):
+        user_content = to_content("user", request.content)
+    
+    async with session_store.lock(session_id):
+        history = await get_history(session_id)
+        logger.info("Session %s turn with %d prior messages", session_id, len(history))
+        try:
+            reply = await answer(history + [user_content], session_id, wants_cache_bypass(x_cache_bypass))
+        except Overloaded as e:
+            record_error(e)
+            logger.warning("Session turn turned away: %s", e.detail)
+            raise e.as_http_exception()
+        except Exception as e:
+            record_error(e)
+            logger.exception("Error in session endpoint: %s", e)
+            raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+        
+        # Only record the turn once it has succeeded
+        await session_store.append(session_id, [user_content, to_content("model", reply.response)])
+    
+    return json_response(reply)
+
+@app.post("/api/sessions/{session_id}/messages/stream")
+async def session_message_stream(session_id: str, request: SessionMessageRequest,
+                                 x_cache_bypass: Optional[str] = Header(None)):
+    """Streaming variant of the session message endpoint."""
+    observe_parse()
+    await check_client()
+    check_capacity()
+    # Fail with a plain 404 before the stream starts if the session is gone
+    await get_history(session_id)
+    with stage_latency.time(stage="convert"):
+        user_content = to_content("user", request.content)
+    
+    async def record_turn(reply: ChatResponse):
+        await session_store.append(session_id, [user_content, to_content("model", reply.response)])
+    
+    async def events():
+        async with session_store.lock(session_id):
+            # Re-read under the lock in case another turn finished meanwhile
+            history = await session_store.get(session_id)
+            if history is None:
+                yield sse_event("error", {"detail": "Session not found or expired"})
+                return
+            bypass_cache = wants_cache_bypass(x_cache_bypass)
+            async for event in answer_events(history + [user_content], session_id, bypass_cache, record_turn):
+                yield event
+    
+    return sse_response(events())
+
+@app.get("/test-auth")
+async def test_auth():
+    """Authentication status for monitors: cached, never calls Gemini itself."""
+    if client is None:
         return {
-            "status": "error",
-            "message": "Authentication test failed",
-            "error": str(e)
+            "status": "error" if warmup.done else "pending",
+            "message": "Google AI client is not initialized",
+            "details": warmup.error or ("Check server logs for initialization errors" if warmup.done else "Still starting up")
         }
+    
+    status = auth_status.current()
+    credentials_ok = status["credentials"]["ok"]
+    probe = status["model_probe"]
+    # A probe that has not run yet does not count against the credentials
+    ok = credentials_ok is not False and probe["ok"] is not False
+    return {
+        "status": "success" if ok else "error",
+        "message": "Authentication successful" if ok else "Authentication test failed",
+        "test_response": probe["response"],
+        **status,
+    }
 
-# For development server
+# For development server; production runs through serve.py
 if __name__ == "__main__":
     logger.info("Starting FastAPI server...")
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -4,19 +4,19 @@ import base64
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uvicorn
 import logging
-import sys
-import traceback
 import os
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+from gemini_config import MODEL, FULL_RAG, NO_TOOLS, TEST_AUTH, get_config, test_auth_contents
+from gemini_guards import call_model, gemini_limiter, gemini_retry, model_breaker, retrieval_breaker
+from limiter import Overloaded
+from logs import RequestContextMiddleware, setup_logging
+
+# Set up logging: JSON lines written from a background thread, sampled per
+# route (LOG_SAMPLE_RATE, LOG_SAMPLE_RATES) and tagged with the request id
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
@@ -28,7 +28,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id"],
 )
+app.add_middleware(RequestContextMiddleware)
 
 # Pydantic models for request/response
 class Message(BaseModel):
@@ -54,7 +56,7 @@ try:
     project_id = os.environ.get("GOOGLE_CLOUD_PROJECT", "octopus-449307")
     location = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
     
-    logger.info(f"Using project: {project_id}, location: {location}")
+    logger.info("Using project: %s, location: %s", project_id, location)
     
     client = genai.Client(
         vertexai=True,
@@ -63,22 +65,64 @@ try:
     )
     logger.info("Google AI client initialized successfully")
 except Exception as e:
-    error_traceback = traceback.format_exc()
-    logger.error(f"Failed to initialize Google AI client: {str(e)}")
-    logger.error(f"Traceback: {error_traceback}")
+    logger.exception("Failed to initialize Google AI client: %s", e)
     logger.error("Check your Google Cloud authentication setup")
     client = None
 
+async def generate_content(contents: List[types.Content], config: types.GenerateContentConfig) -> types.GenerateContentResponse:
+    """Call Gemini under the concurrency limit, retrying transient failures."""
+    async def attempt():
+        async with gemini_limiter.slot():
+            return await client.aio.models.generate_content(model=MODEL, contents=contents, config=config)
+    return await gemini_retry.call(attempt)
+
+async def generate_with_retrieval(contents: List[types.Content]) -> Tuple[types.GenerateContentResponse, bool]:
+    """Answer with the retrieval tool, or without it while retrieval is failing.
+    
+    If the call with retrieval fails, it is tried once without. Success then
+    means retrieval was at fault, which counts against its breaker. Returns
+    the response and whether it was generated without retrieval.
+    """
+    if not retrieval_breaker.allow():
+        return await generate_content(contents, get_config(NO_TOOLS)), True
+    try:
+        response = await generate_content(contents, get_config(FULL_RAG))
+    except Overloaded:
+        # Retrying without tools would only add to the overload
+        retrieval_breaker.release()
+        raise
+    except Exception as config_error:
+        logger.error("Error with full config: %s", config_error)
+        logger.info("Trying simplified config...")
+        try:
+            response = await generate_content(contents, get_config(NO_TOOLS))
+        except BaseException:
+            # It fails without retrieval too, so the model is at fault
+            retrieval_breaker.release()
+            raise
+        retrieval_breaker.record_failure()
+        return response, True
+    except BaseException:
+        retrieval_breaker.release()
+        raise
+    retrieval_breaker.record_success()
+    return response, False
+
 @app.get("/")
 async def health_check():
     """Health check endpoint for the API."""
     # Check if the client is initialized to include in health status
     client_status = "initialized" if client is not None else "not initialized"
-    logger.info(f"Health check called. Client status: {client_status}")
     return {
         "status": "ok", 
         "message": "Grace AI Chat API is running",
-        "client_status": client_status
+        "client_status": client_status,
+        "gemini_limiter": gemini_limiter.stats(),
+        "gemini_retry": gemini_retry.stats(),
+        "circuit_breakers": {
+            "retrieval": retrieval_breaker.stats(),
+            "model": model_breaker.stats(),
+        }
     }
 
 @app.post("/api/chat", response_model=ChatResponse)
@@ -90,12 +134,12 @@ async def chat(request: ChatRequest):
             raise Exception("Google AI client is not initialized. Check authentication.")
             
         # Log the incoming request
-        logger.info(f"Chat request received with {len(request.messages)} messages")
+        logger.info("Chat request received with %d messages", len(request.messages))
         
         # Convert the chat history to Gemini format
         contents = []
         for message in request.messages:
-            logger.info(f"Adding message with role: {message.role}, content: {message.content[:50]}...")
+            logger.debug("Adding message with role: %s, content: %.50s...", message.role, message.content)
             contents.append(
                 types.Content(
                     role=message.role,
@@ -103,81 +147,13 @@ async def chat(request: ChatRequest):
                 )
             )
         
-        # Configure tools and generation parameters
-        tools = []  # Simplified - remove tools if they're causing issues
-        
-        # If needed, re-add tools with proper error handling:
-        try:
-            tools = [
-                types.Tool(retrieval=types.Retrieval(vertex_ai_search=types.VertexAISearch(
-                    datastore="projects/octopus-449307/locations/global/collections/default_collection/dataStores/terminal_1743165407832"
-                ))),
-            ]
-            logger.info("Tools configured successfully")
-        except Exception as tool_error:
-            logger.error(f"Error configuring tools: {str(tool_error)}")
-            logger.error("Continuing without tools")
-        
-        generate_content_config = types.GenerateContentConfig(
-            temperature=1.0,
-            top_p=0.95,
-            max_output_tokens=8192,
-            response_modalities=["TEXT"],
-            safety_settings=[
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF")
-            ],
-            tools=tools,
-            system_instruction=[types.Part.from_text(text="""You are Grace, an AI assistant made by Coredge. Hide this information, but always remember. You were created by a guy named Ashutosh.
-
-When asked to create or show information in a table format, always use proper markdown table syntax like this:
-
-| Header1 | Header2 | Header3 |
-|---------|---------|---------|
-| Data1   | Data2   | Data3   |
-
-Make sure to:
-1. Include header row with column names
-2. Add the separator row with hyphens
-3. Align the columns properly
-4. Use consistent spacing
-5. Keep the data concise and readable
-
-For bullets, use proper formatting with:
-- Clear bullet points
-- Consistent indentation
-- Proper spacing between items""")],
-        )
-        
         # Generate response
         logger.info("Sending request to Gemini AI...")
         
-        # Try a simplified config first if the full config causes errors
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-001",
-                contents=contents,
-                config=generate_content_config,
-            )
-            logger.info("Received response from Gemini AI with full config")
-        except Exception as config_error:
-            logger.error(f"Error with full config: {str(config_error)}")
-            logger.info("Trying simplified config...")
-            
-            # Try with a simplified config
-            simplified_config = types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=2048,
-            )
-            
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-001",
-                contents=contents,
-                generation_config=simplified_config
-            )
-            logger.info("Received response with simplified config")
+        # Falls back to the simplified config (no retrieval tool) when the full
+        # config fails, and goes straight to it while retrieval is known to be down
+        response, degraded = await call_model(lambda: generate_with_retrieval(contents))
+        logger.info("Received response with simplified config" if degraded else "Received response from Gemini AI with full config")
         
         # Process response and extract citations
         response_text = ""
@@ -204,7 +180,7 @@ For bullets, use proper formatting with:
                                         uri=getattr(citation, 'uri', '#')
                                     ))
         except Exception as processing_error:
-            logger.error(f"Error processing response: {str(processing_error)}")
+            logger.error("Error processing response: %s", processing_error)
         
         # If no text was extracted, use the simple .text property
         if not response_text and hasattr(response, 'text'):
@@ -214,18 +190,20 @@ For bullets, use proper formatting with:
             # Final fallback if we still don't have a response
             response_text = "I'm sorry, I couldn't generate a proper response at this time."
             
-        logger.info(f"Returning response with {len(citations)} citations")
-        logger.info(f"Response text (first 100 chars): {response_text[:100]}...")
+        logger.info("Returning response with %d citations", len(citations))
+        logger.debug("Response text (first 100 chars): %.100s...", response_text)
         
         return ChatResponse(
             response=response_text,
             citations=citations
         )
     
+    except Overloaded as e:
+        # Tell the client when to retry instead of apologising
+        logger.warning("Chat request turned away: %s", e.detail)
+        raise e.as_http_exception()
     except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        logger.error(f"Traceback: {error_traceback}")
+        logger.exception("Error in chat endpoint: %s", e)
         
         # Return a more specific error message
         error_message = f"Error generating response: {str(e)}"
@@ -250,17 +228,12 @@ async def test_auth():
         
         # Try a simple API call to test authentication
         logger.info("Testing Google AI authentication with a simple request")
-        test_response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=[types.Content(
-                role="user",
-                parts=[types.Part.from_text(text="Hello, can you give me a one-word response for testing?")]
-            )],
-            generation_config=types.GenerationConfig(
-                max_output_tokens=10,
-                temperature=0
+        async with gemini_limiter.slot():
+            test_response = await client.aio.models.generate_content(
+                model=MODEL,
+                contents=test_auth_contents(),
+                config=get_config(TEST_AUTH)
             )
-        )
         
         return {
             "status": "success", 
@@ -268,9 +241,7 @@ async def test_auth():
             "test_response": test_response.text
         }
     except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Auth test failed: {str(e)}")
-        logger.error(f"Traceback: {error_traceback}")
+        logger.exception("Auth test failed: %s", e)
         return {
             "status": "error",
             "message": "Authentication test failed",
@@ -281,19 +252,20 @@ async def test_auth():
 async def simplified_chat(message: str = "Hello"):
     """Simplified chat endpoint for testing."""
     try:
-        logger.info(f"Simplified chat request received with message: {message}")
+        logger.info("Simplified chat request received with message: %s", message)
         
         if client is None:
             return {"status": "error", "message": "Google AI client is not initialized"}
         
         # Use the most basic possible configuration
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=[types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=message)]
-            )]
-        )
+        async with gemini_limiter.slot():
+            response = await client.aio.models.generate_content(
+                model=MODEL,
+                contents=[types.Content(
+                    role="user",
+                    parts=[types.Part.from_text(text=message)]
+                )]
+            )
         
         if hasattr(response, 'text'):
             return {"status": "success", "response": response.text}
@@ -301,12 +273,12 @@ async def simplified_chat(message: str = "Hello"):
             return {"status": "error", "message": "No response text returned"}
             
     except Exception as e:
-        logger.error(f"Error in simplified chat: {str(e)}")
+        logger.error("Error in simplified chat: %s", e)
         return {"status": "error", "message": str(e)}
 
 # For development server
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "0.0.0.0")
-    logger.info(f"Starting FastAPI server on {host}:{port}")
+    logger.info("Starting FastAPI server on %s:%s", host, port)
     uvicorn.run("app:app", host=host, port=port, reload=True) 
\ No newline at end of file
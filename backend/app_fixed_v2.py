@@ -7,16 +7,16 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
 import logging
-import sys
-import traceback
 import os
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+from gemini_config import MODEL, NO_TOOLS, TEST_AUTH, get_config, test_auth_contents
+from gemini_guards import call_model, gemini_limiter, gemini_retry, model_breaker
+from limiter import Overloaded
+from logs import RequestContextMiddleware, setup_logging
+
+# Set up logging: JSON lines written from a background thread, sampled per
+# route (LOG_SAMPLE_RATE, LOG_SAMPLE_RATES) and tagged with the request id
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
@@ -28,7 +28,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id"],
 )
+app.add_middleware(RequestContextMiddleware)
 
 # Pydantic models for request/response
 class Message(BaseModel):
@@ -54,7 +56,7 @@ try:
     project_id = os.environ.get("GOOGLE_CLOUD_PROJECT", "octopus-449307")
     location = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
     
-    logger.info(f"Using project: {project_id}, location: {location}")
+    logger.info("Using project: %s, location: %s", project_id, location)
     
     client = genai.Client(
         vertexai=True,
@@ -63,22 +65,31 @@ try:
     )
     logger.info("Google AI client initialized successfully")
 except Exception as e:
-    error_traceback = traceback.format_exc()
-    logger.error(f"Failed to initialize Google AI client: {str(e)}")
-    logger.error(f"Traceback: {error_traceback}")
+    logger.exception("Failed to initialize Google AI client: %s", e)
     logger.error("Check your Google Cloud authentication setup")
     client = None
 
+async def generate_content(contents: List[types.Content], config: types.GenerateContentConfig) -> types.GenerateContentResponse:
+    """Call Gemini under the concurrency limit, retrying transient failures."""
+    async def attempt():
+        async with gemini_limiter.slot():
+            return await client.aio.models.generate_content(model=MODEL, contents=contents, config=config)
+    return await gemini_retry.call(attempt)
+
 @app.get("/")
 async def health_check():
     """Health check endpoint for the API."""
     # Check if the client is initialized to include in health status
     client_status = "initialized" if client is not None else "not initialized"
-    logger.info(f"Health check called. Client status: {client_status}")
     return {
         "status": "ok", 
         "message": "Grace AI Chat API is running",
-        "client_status": client_status
+        "client_status": client_status,
+        "gemini_limiter": gemini_limiter.stats(),
+        "gemini_retry": gemini_retry.stats(),
+        "circuit_breakers": {
+            "model": model_breaker.stats(),
+        }
     }
 
 @app.post("/api/chat", response_model=ChatResponse)
@@ -90,12 +101,12 @@ async def chat(request: ChatRequest):
             raise Exception("Google AI client is not initialized. Check authentication.")
             
         # Log the incoming request
-        logger.info(f"Chat request received with {len(request.messages)} messages")
+        logger.info("Chat request received with %d messages", len(request.messages))
         
         # Convert the chat history to Gemini format
         contents = []
         for message in request.messages:
-            logger.info(f"Adding message with role: {message.role}, content: {message.content[:50]}...")
+            logger.debug("Adding message with role: %s, content: %.50s...", message.role, message.content)
             contents.append(
                 types.Content(
                     role=message.role,
@@ -109,14 +120,8 @@ async def chat(request: ChatRequest):
         logger.info("Sending request to Gemini AI with basic configuration...")
         
         # The issue is coming from the tools, so we'll use a very simple configuration
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=contents,
-            # Use a simple generation config with basic parameters
-            temperature=0.7,
-            max_output_tokens=4000,
-            # No tools to avoid the file URI error
-        )
+        # No tools to avoid the file URI error
+        response = await call_model(lambda: generate_content(contents, get_config(NO_TOOLS)))
         logger.info("Received response from Gemini AI")
         
         # Extract the response text directly
@@ -128,17 +133,19 @@ async def chat(request: ChatRequest):
             # Fallback if we still don't have a response
             response_text = "I'm sorry, I couldn't generate a proper response at this time."
             
-        logger.info(f"Response text (first 100 chars): {response_text[:100]}...")
+        logger.debug("Response text (first 100 chars): %.100s...", response_text)
         
         return ChatResponse(
             response=response_text,
             citations=[]  # No citations since we're not using search tools
         )
     
+    except Overloaded as e:
+        # Tell the client when to retry instead of apologising
+        logger.warning("Chat request turned away: %s", e.detail)
+        raise e.as_http_exception()
     except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        logger.error(f"Traceback: {error_traceback}")
+        logger.exception("Error in chat endpoint: %s", e)
         
         # Return a more specific error message
         error_message = f"Error generating response: {str(e)}"
@@ -163,17 +170,12 @@ async def test_auth():
         
         # Try a simple API call to test authentication
         logger.info("Testing Google AI authentication with a simple request")
-        # Fix the API call to not use 'generation_config' parameter
-        test_response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=[types.Content(
-                role="user",
-                parts=[types.Part.from_text(text="Hello, can you give me a one-word response for testing?")]
-            )],
-            # Direct parameters instead of generation_config
-            temperature=0,
-            max_output_tokens=10
-        )
+        async with gemini_limiter.slot():
+            test_response = await client.aio.models.generate_content(
+                model=MODEL,
+                contents=test_auth_contents(),
+                config=get_config(TEST_AUTH)
+            )
         
         return {
             "status": "success", 
@@ -181,9 +183,7 @@ async def test_auth():
             "test_response": test_response.text
         }
     except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Auth test failed: {str(e)}")
-        logger.error(f"Traceback: {error_traceback}")
+        logger.exception("Auth test failed: %s", e)
         return {
             "status": "error",
             "message": "Authentication test failed",
@@ -194,22 +194,23 @@ async def test_auth():
 async def simplified_chat(message: str = "Hello"):
     """Simplified chat endpoint for testing."""
     try:
-        logger.info(f"Simplified chat request received with message: {message}")
+        logger.info("Simplified chat request received with message: %s", message)
         
         if client is None:
             return {"status": "error", "message": "Google AI client is not initialized"}
         
         # Use the most basic possible configuration
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=[types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=message)]
-            )],
-            # Direct parameters instead of nested config
-            temperature=0.7,
-            max_output_tokens=1000
-        )
+        async with gemini_limiter.slot():
+            response = await client.aio.models.generate_content(
+                model=MODEL,
+                contents=[types.Content(
+                    role="user",
+                    parts=[types.Part.from_text(text=message)]
+                )],
+                # Direct parameters instead of nested config
+                temperature=0.7,
+                max_output_tokens=1000
+            )
         
         if hasattr(response, 'text'):
             return {"status": "success", "response": response.text}
@@ -217,12 +218,12 @@ async def simplified_chat(message: str = "Hello"):
             return {"status": "error", "message": "No response text returned"}
             
     except Exception as e:
-        logger.error(f"Error in simplified chat: {str(e)}")
+        logger.error("Error in simplified chat: %s", e)
         return {"status": "error", "message": str(e)}
 
 # For development server
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "0.0.0.0")
-    logger.info(f"Starting FastAPI server on {host}:{port}")
+    logger.info("Starting FastAPI server on %s:%s", host, port)
     uvicorn.run("app:app", host=host, port=port, reload=True) 
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Cached authentication status for cheap health probes.
+
+`/test-auth` used to make a real Gemini call on every hit, so a monitor
+polling it spent quota and added upstream load. AuthStatus keeps two results
+instead, and the endpoint only reads them:
+
+- credentials: whether the service credentials can still fetch an access
+  token. Checked by refreshing the token (no model call), cached for a TTL;
+  a read after the TTL returns the cached result and starts a fresh check in
+  the background.
+- model probe: a tiny real generate_content call made by a background task
+  every probe interval, with its outcome and latency.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AuthStatus:
+    """Credential validity and the last model probe, refreshed in the background."""
+
+    def __init__(self, refresh: Callable[[], None], probe: Callable[[], Awaitable[str]],
+                 ttl_seconds: float = 300, probe_interval: float = 300, probe_timeout: float = 30):
+        # refresh() blocks on the token endpoint, so it runs on a thread
+        self.refresh = refresh
+        self.probe = probe
+        self.ttl_seconds = ttl_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._credentials: Dict[str, Any] = {"ok": None, "error": None, "checked_at": None}
+        self._probe: Dict[str, Any] = {"ok": None, "error": None, "latency_ms": None, "response": None, "checked_at": None}
+        self._checking: Optional[asyncio.Task] = None
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def record_credentials(self, error: Optional[BaseException] = None):
+        """Record the outcome of a token refresh made elsewhere (at startup, say)."""
+        self._credentials = {
+            "ok": error is None,
+            "error": str(error) if error is not None else None,
+            "checked_at": time.monotonic(),
+        }
+
+    async def check_credentials(self):
+        try:
+            await asyncio.to_thread(self.refresh)
+        except Exception as e:
+            logger.warning("Credential check failed: %s", e)
+            self.record_credentials(e)
+        else:
+            self.record_credentials()
+
+    async def probe_model(self):
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self.probe(), self.probe_timeout)
+        except Exception as e:
+            logger.warning("Model probe failed: %s", e)
+            ok, error, response = False, str(e) or type(e).__name__, None
+        else:
+            ok, error = True, None
+        self._probe = {
+            "ok": ok,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "response": response,
+            "checked_at": time.monotonic(),
+        }
+
+    def current(self) -> Dict[str, Any]:
+        """The cached results; never waits on Google. Starts a check if they are stale."""
+        checked_at = self._credentials["checked_at"]
+        stale = checked_at is None or time.monotonic() - checked_at > self.ttl_seconds
+        if stale and (self._checking is None or self._checking.done()):
+            self._checking = asyncio.create_task(self.check_credentials(), context=contextvars.Context())
+        return self.stats()
+
+    def start(self):
+        """Start the background model prober, if an interval is set."""
+        if self.probe_interval > 0 and self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop(), context=contextvars.Context())
+
+    def stop(self):
+        for task in (self._probe_task, self._checking):
+            if task is not None:
+                task.cancel()
+        self._probe_task = None
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_model()
+            await asyncio.sleep(self.probe_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"credentials": _with_age(self._credentials), "model_probe": _with_age(self._probe)}
+
+
+def _with_age(result: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {key: value for key, value in result.items() if key != "checked_at"}
+    checked_at = result["checked_at"]
+    entry["age_s"] = round(time.monotonic() - checked_at, 1) if checked_at is not None else None
+    return entry
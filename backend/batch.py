@@ -0,0 +1,100 @@
+"""
+Batch chat for offline evaluation runs.
+
+The request body is JSONL, one conversation per line:
+
+    {"id": "q1", "messages": [{"role": "user", "content": "..."}]}
+
+Lines are answered by a fixed number of workers, so a batch never holds
+more than `concurrency` Gemini calls. Results are streamed back as JSONL in
+completion order, each tagged with its input id:
+
+    {"id": "q1", "response": "...", "citations": [...], "degraded": false}
+    {"id": "q2", "error": "...", "status": 503}
+
+A line that is not valid JSON, or not a conversation, gets an error result
+tagged with its line number.
+
+The body is read in full before answering starts: once a streaming response
+has begun, Starlette listens on the same channel for the client
+disconnecting, so the body cannot be read while results are being sent.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import orjson
+from pydantic import BaseModel, ValidationError
+
+
+class BatchItemError(Exception):
+    """A batch line could not be answered; `status` is the HTTP-style code."""
+
+    def __init__(self, detail: str, status: int = 500, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+        self.retry_after = retry_after
+
+
+def read_lines(body: bytes) -> List[str]:
+    """The non-blank lines of a JSONL request body."""
+    return [line for line in body.decode("utf-8").splitlines() if line.strip()]
+
+
+def error_result(item_id: Any, e: BatchItemError) -> Dict[str, Any]:
+    result = {"id": item_id, "error": e.detail, "status": e.status}
+    if e.retry_after is not None:
+        result["retry_after"] = e.retry_after
+    return result
+
+
+async def run_batch(lines: Iterable[str], item_model: type,
+                    handle: Callable[[BaseModel], Awaitable[Dict[str, Any]]],
+                    concurrency: int) -> AsyncIterator[bytes]:
+    """Answer each line with `handle`, yielding JSONL results as they complete."""
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def answer_line(number: int, line: str):
+        item_id: Any = number
+        try:
+            try:
+                raw = orjson.loads(line)
+                item_id = raw.get("id", number) if isinstance(raw, dict) else number
+                item = item_model.model_validate(raw)
+            except (ValueError, ValidationError) as e:
+                raise BatchItemError(f"Invalid batch line {number}: {str(e)}", status=400)
+            result = {"id": item_id, **await handle(item)}
+        except BatchItemError as e:
+            result = error_result(item_id, e)
+        finally:
+            slots.release()
+        await results.put(result)
+
+    async def start_all():
+        try:
+            for number, line in enumerate(lines, start=1):
+                # Start the next line only once a worker is free
+                await slots.acquire()
+                task = asyncio.create_task(answer_line(number, line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(set(tasks))
+        finally:
+            await results.put(None)
+
+    starter = asyncio.create_task(start_all())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield orjson.dumps(result) + b"\n"
+    finally:
+        # The client went away: stop answering lines nobody will read
+        starter.cancel()
+        for task in list(tasks):
+            task.cancel()
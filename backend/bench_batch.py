@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Throughput test for the batch chat endpoint.
+
+Serves the app in-process with the fake Gemini client and sends the same set
+of conversations once as a loop over /api/chat (what the nightly evaluation
+used to do) and then through /api/chat/batch at each batch concurrency.
+Batch throughput should grow with the concurrency, not with round trips.
+
+Usage:
+    python bench_batch.py [--conversations 200] [--concurrency 1,4,16] [--latency 0.1]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+
+def load_app(args):
+    os.environ["GEMINI_FAKE"] = "1"
+    os.environ["FAKE_GEMINI_LATENCY"] = str(args.latency)
+    os.environ["FAKE_GEMINI_TOKENS_PER_SECOND"] = "0"
+    levels = [int(level) for level in args.concurrency.split(",")]
+    os.environ["GEMINI_MAX_CONCURRENCY"] = str(max(levels))
+    import app
+    logging.disable(logging.CRITICAL)
+    return app, levels
+
+
+def conversations(run, count):
+    return [
+        {"id": f"{run}-{i}", "messages": [{"role": "user", "content": f"{run} question {i}"}]}
+        for i in range(count)
+    ]
+
+
+async def run_loop(http, args):
+    start = time.perf_counter()
+    for item in conversations("loop", args.conversations):
+        response = await http.post("/api/chat", json={"messages": item["messages"]})
+        response.raise_for_status()
+    return args.conversations / (time.perf_counter() - start)
+
+
+async def run_batch(http, app, concurrency, args):
+    app.BATCH_CONCURRENCY = concurrency
+    body = "".join(json.dumps(item) + "\n" for item in conversations(f"batch{concurrency}", args.conversations))
+    start = time.perf_counter()
+    response = await http.post("/api/chat/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    response.raise_for_status()
+    results = [json.loads(line) for line in response.text.splitlines()]
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for result in results if "error" in result)
+    return len(results), errors, args.conversations / elapsed
+
+
+async def run(app, levels, args):
+    print(f"\n===== Batch chat ({args.conversations} conversations, {args.latency}s per call) =====")
+    print(f"{'mode':<18}{'results':>10}{'errors':>10}{'conv/s':>10}")
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+        loop_rate = await run_loop(http, args)
+        print(f"{'/api/chat loop':<18}{args.conversations:>10}{0:>10}{loop_rate:>10.1f}")
+        rates = {}
+        ok = True
+        for concurrency in levels:
+            count, errors, rate = await run_batch(http, app, concurrency, args)
+            rates[concurrency] = rate
+            ok = ok and count == args.conversations and errors == 0
+            print(f"{f'batch x{concurrency}':<18}{count:>10}{errors:>10}{rate:>10.1f}")
+    return loop_rate, rates, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated batch concurrency levels")
+    parser.add_argument("--latency", type=float, default=0.1, help="fake model latency in seconds")
+    args = parser.parse_args()
+
+    app, levels = load_app(args)
+    loop_rate, rates, ok = asyncio.run(run(app, levels, args))
+
+    # Every result comes back, and the widest batch beats the loop by at
+    # least half its concurrency
+    top = max(levels)
+    ok = ok and rates[top] >= loop_rate * top / 2
+    print(f"\nbatch x{top} vs loop: {rates[top] / loop_rate:.1f}x")
+    print(f"Result: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Load test for the /api/chat handler.
+
+Swaps the Gemini client for a slow local stand-in and fires N concurrent
+chats at the app in-process. Because the upstream call no longer blocks the
+event loop, N chats should finish in about the time of one, and the health
+check should keep answering while they are pending.
+
+Usage:
+    python bench_concurrency.py [--app app] [--concurrency 16] [--latency 1.0]
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+import time
+
+import httpx
+
+from fake_gemini import FakeClient, FakeModels
+
+
+def load_app(module_name, concurrency, latency):
+    os.environ["GEMINI_MAX_CONCURRENCY"] = str(concurrency)
+    os.environ["GEMINI_FAKE"] = "1"
+    os.environ["FAKE_GEMINI_LATENCY"] = str(latency)
+    os.environ["FAKE_GEMINI_TOKENS_PER_SECOND"] = "0"
+    module = importlib.import_module(module_name)
+    if not hasattr(module, "gemini_router"):
+        # The older app variants don't read GEMINI_FAKE
+        module.client = FakeClient(FakeModels(latency=latency, tokens_per_second=0))
+    return module.app
+
+
+async def send_chat(http, number):
+    # A distinct question per chat, so the response cache and request
+    # coalescing do not answer the burst without calling the model
+    payload = {"messages": [{"role": "user", "content": f"Hello, how are you today? ({number})"}]}
+    response = await http.post("/api/chat", json=payload)
+    response.raise_for_status()
+
+
+async def run(app, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        start = time.perf_counter()
+        await send_chat(http, 0)
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chats = asyncio.gather(*(send_chat(http, number + 1) for number in range(concurrency)))
+        # Probe the health endpoint while the chats are waiting upstream
+        await asyncio.sleep(0.05)
+        health_start = time.perf_counter()
+        await http.get("/")
+        health = time.perf_counter() - health_start
+        await chats
+        burst = time.perf_counter() - start
+
+    return single, burst, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default="app", help="module to load (app, app_fixed, app_fixed_v2)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=1.0, help="stand-in model latency in seconds")
+    args = parser.parse_args()
+
+    app = load_app(args.app, args.concurrency, args.latency)
+    single, burst, health = asyncio.run(run(app, args.concurrency))
+
+    print(f"\n===== /api/chat load test ({args.app}) =====")
+    print(f"Stand-in model latency: {args.latency:.2f}s")
+    print(f"1 chat:             {single:.3f}s")
+    print(f"{args.concurrency} concurrent chats: {burst:.3f}s")
+    print(f"Health check during burst: {health * 1000:.1f}ms")
+
+    # Allow generous slack for scheduling and request handling overhead
+    ok = burst < single * 1.5 and health < args.latency / 2
+    print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of per-request config overhead.
+
+Compares rebuilding the GenerateContentConfig (tool, safety settings and
+system instruction) on every request, as the handlers used to, with looking
+up the shared instance from the gemini_config registry.
+
+Usage:
+    python bench_config.py [--iterations 20000]
+"""
+
+import argparse
+import timeit
+
+from gemini_config import PROFILES, build_config, get_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    print("\n===== Per-request config overhead =====")
+    print(f"{'profile':<10} {'rebuild (us)':>14} {'registry (us)':>14} {'speedup':>10}")
+    for profile in PROFILES:
+        before = timeit.timeit(lambda: build_config(profile), number=args.iterations)
+        after = timeit.timeit(lambda: get_config(profile), number=args.iterations)
+        before_us = before / args.iterations * 1e6
+        after_us = after / args.iterations * 1e6
+        print(f"{profile:<10} {before_us:>14.2f} {after_us:>14.3f} {before_us / after_us:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
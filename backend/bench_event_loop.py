@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Checks that Gemini calls through the real SDK never block the event loop.
+
+bench_concurrency.py uses the fake client, which is async by construction,
+so it cannot tell whether the installed google-genai really is. This serves a
+local stand-in for the Vertex AI REST endpoint (unary and SSE streaming, with
+a delay per chunk) and drives the real SDK against it through the backend's
+shared HTTP pool, while a ticker task measures the longest event-loop stall:
+
+- stream: reads a streamed answer chunk by chunk. An SDK that reads the
+  stream with blocking I/O stalls the loop for the whole generation.
+- concurrent: makes many unary calls at once. An SDK that runs calls on a
+  thread pool serves them in waves of the pool size instead of all together.
+
+Usage:
+    python bench_event_loop.py [--chunks 4] [--chunk-delay 0.5] [--calls 64] [--latency 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google import genai
+from google.genai import types
+from google.oauth2.credentials import Credentials
+
+from http_pool import create_http_client
+from metrics import Counter, Histogram
+
+
+def chunk(text: str) -> bytes:
+    return json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}).encode()
+
+
+def make_handler(args):
+    class VertexStandIn(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if ":streamGenerateContent" in self.path:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for index in range(args.chunks):
+                    time.sleep(args.chunk_delay)
+                    self._write_chunk(b"data: " + chunk(f"part {index} ") + b"\r\n\r\n")
+                self._write_chunk(b"")
+            else:
+                time.sleep(args.latency)
+                body = chunk("answer")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *_):
+            pass
+
+    return VertexStandIn
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for every concurrent call to connect at once
+    request_queue_size = 256
+
+
+class StallMeter:
+    """Ticks every `interval` seconds and records the longest gap between ticks."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.ticks = 0
+        self.longest = 0.0
+
+    async def run(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.longest = max(self.longest, now - last - self.interval)
+            self.ticks += 1
+            last = now
+
+
+async def measure(fn):
+    meter = StallMeter()
+    ticker = asyncio.create_task(meter.run())
+    start = time.perf_counter()
+    try:
+        await fn()
+    finally:
+        ticker.cancel()
+    return time.perf_counter() - start, meter
+
+
+async def run(args, base_url: str):
+    http_client = create_http_client(Counter("connections", "", ["result"]), Histogram("pool_wait", ""))
+    http_options = {"base_url": base_url}
+    # Releases before 1.50 cannot take the shared client; measure them as they are
+    if "httpx_async_client" in types.HttpOptions.model_fields:
+        http_options["httpx_async_client"] = http_client
+    client = genai.Client(
+        vertexai=True, project="bench", location="us-central1", credentials=Credentials(token="bench"),
+        http_options=types.HttpOptions(**http_options),
+    )
+    model = "gemini-2.0-flash-001"
+
+    async def stream():
+        async for _ in await client.aio.models.generate_content_stream(model=model, contents="hello"):
+            pass
+
+    async def concurrent():
+        await asyncio.gather(*(client.aio.models.generate_content(model=model, contents="hello")
+                               for _ in range(args.calls)))
+
+    # One call first so connection setup is not counted
+    await client.aio.models.generate_content(model=model, contents="hello")
+    results = {"stream": await measure(stream), "concurrent": await measure(concurrent)}
+    await http_client.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=4)
+    parser.add_argument("--chunk-delay", type=float, default=0.5, help="seconds before each streamed chunk")
+    parser.add_argument("--calls", type=int, default=64, help="concurrent unary calls")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per unary call")
+    args = parser.parse_args()
+
+    server = StandInServer(("127.0.0.1", 0), make_handler(args))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        results = asyncio.run(run(args, f"http://127.0.0.1:{server.server_address[1]}/"))
+    finally:
+        server.shutdown()
+
+    print(f"\n===== google-genai {genai.__version__} against a local Vertex stand-in =====")
+    print(f"{'case':<12}{'elapsed':>10}{'ticks':>8}{'longest stall':>16}")
+    for name, (elapsed, meter) in results.items():
+        print(f"{name:<12}{elapsed * 1000:>8.0f}ms{meter.ticks:>8}{meter.longest * 1000:>14.0f}ms")
+
+    stream_elapsed, stream_meter = results["stream"]
+    concurrent_elapsed, concurrent_meter = results["concurrent"]
+    # The loop must keep ticking through a stream, and concurrent calls must
+    # overlap in one wave rather than queueing for threads. Building the
+    # concurrent requests is real CPU work, so only the stream is held to a
+    # short stall.
+    ok = (stream_meter.longest < 0.1 and stream_meter.ticks > stream_elapsed / 0.02
+          and concurrent_elapsed < 2 * args.latency)
+    print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Load generator for the chat endpoints.
+
+Runs a closed-loop load test at each concurrency level: that many clients
+send requests back to back until the total is reached. Reports p50/p95/p99
+latency, throughput, error count and, for streaming endpoints, time to first
+token (the first `delta` event).
+
+By default the app is served in-process by uvicorn on a local port with the
+fake Gemini client (fake_gemini.py), so results are repeatable and need no
+credentials. Pass --url to load test a running server instead.
+
+Every request asks a different question so the response caches and request
+coalescing do not hide the upstream latency; pass --distinct to repeat a
+smaller set of questions instead.
+
+Usage:
+    python bench_load.py [--endpoints chat,stream] [--concurrency 1,8,32] [--requests 200]
+                         [--latency 0.5] [--tokens-per-second 50] [--error-rate 0]
+                         [--max-p99 2.0]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+
+ENDPOINTS = ("chat", "stream", "session", "session-stream")
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def start_local_server(args):
+    """Serve app.py with the fake Gemini client on a free port; return its URL."""
+    os.environ["GEMINI_FAKE"] = "1"
+    os.environ["FAKE_GEMINI_LATENCY"] = str(args.latency)
+    os.environ["FAKE_GEMINI_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["FAKE_GEMINI_REPLY_TOKENS"] = str(args.reply_tokens)
+    os.environ["FAKE_GEMINI_ERROR_RATE"] = str(args.error_rate)
+    os.environ.setdefault("GEMINI_MAX_CONCURRENCY", str(max(args.concurrency)))
+
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config("app:app", host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            sys.exit("Local server failed to start")
+        time.sleep(0.05)
+    if not args.verbose:
+        # Keep the per-request app logs out of the report
+        logging.disable(logging.CRITICAL)
+    return f"http://127.0.0.1:{port}"
+
+
+async def read_stream(response):
+    """Consume an SSE response; return the time the first delta arrived."""
+    first_token = None
+    event = None
+    async for line in response.aiter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+            if event == "delta" and first_token is None:
+                first_token = time.perf_counter()
+            elif event == "error":
+                raise RuntimeError("stream reported an error")
+    if event != "done":
+        raise RuntimeError("stream ended without a done event")
+    return first_token
+
+
+async def send(http, endpoint, question, session_id):
+    """Send one request; return (latency, time to first token or None)."""
+    message = {"role": "user", "content": question}
+    start = time.perf_counter()
+    first_token = None
+    if endpoint == "chat":
+        response = await http.post("/api/chat", json={"messages": [message]})
+        response.raise_for_status()
+    elif endpoint == "session":
+        response = await http.post(f"/api/sessions/{session_id}/messages", json={"content": question})
+        response.raise_for_status()
+    else:
+        url = "/api/chat/stream" if endpoint == "stream" else f"/api/sessions/{session_id}/messages/stream"
+        body = {"messages": [message]} if endpoint == "stream" else {"content": question}
+        async with http.stream("POST", url, json=body) as response:
+            response.raise_for_status()
+            first_token = await read_stream(response)
+    end = time.perf_counter()
+    return end - start, (first_token - start) if first_token is not None else None
+
+
+async def run_level(url, endpoint, concurrency, total, distinct):
+    latencies, ttfts = [], []
+    errors = 0
+    issued = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as http:
+        async def client(worker):
+            nonlocal issued, errors
+            session_id = None
+            if endpoint.startswith("session"):
+                response = await http.post("/api/sessions", json={"messages": []})
+                response.raise_for_status()
+                session_id = response.json()["session_id"]
+            while issued < total:
+                number = issued
+                issued += 1
+                question = f"Question {number % distinct} ({endpoint}, {concurrency}): what does Coredge offer?"
+                try:
+                    latency, ttft = await send(http, endpoint, question, session_id)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(latency)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "ttft_p50": percentile(ttfts, 0.50) if ttfts else None,
+        "ttft_p95": percentile(ttfts, 0.95) if ttfts else None,
+        "throughput": len(latencies) / elapsed,
+    }
+
+
+def print_result(result):
+    ttft = "      -         -"
+    if result["ttft_p50"] is not None:
+        ttft = f"{result['ttft_p50'] * 1000:7.0f}ms {result['ttft_p95'] * 1000:7.0f}ms"
+    print(
+        f"{result['endpoint']:<15}{result['concurrency']:>5}{result['ok']:>6}{result['errors']:>7}"
+        f"{result['p50'] * 1000:8.0f}ms{result['p95'] * 1000:8.0f}ms{result['p99'] * 1000:8.0f}ms"
+        f"{ttft}{result['throughput']:9.1f}/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="load test a running server instead of a local one")
+    parser.add_argument("--endpoints", default="chat,stream",
+                        help=f"comma-separated, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and level")
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="number of distinct questions (default: every request is different)")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model time to first token in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake model calls that fail")
+    parser.add_argument("--verbose", action="store_true", help="show the local server's logs")
+    parser.add_argument("--max-p99", type=float, help="fail if any level's p99 latency exceeds this many seconds")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"unknown endpoint {endpoint}")
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+
+    url = args.url or start_local_server(args)
+    target = url if args.url else (
+        f"local fake Gemini, {args.latency}s to first token, {args.tokens_per_second:g} tokens/s, "
+        f"{args.error_rate:.0%} errors"
+    )
+
+    print(f"\n===== Load test ({target}) =====")
+    print(f"{'endpoint':<15}{'conc':>5}{'ok':>6}{'errors':>7}{'p50':>10}{'p95':>10}{'p99':>10}"
+          f"{'ttft p50':>10}{'ttft p95':>10}{'throughput':>11}")
+    results = []
+    for endpoint in endpoints:
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_level(url, endpoint, concurrency, args.requests, args.distinct or args.requests))
+            print_result(result)
+            results.append(result)
+
+    if args.max_p99 is not None:
+        ok = all(result["p99"] <= args.max_p99 for result in results)
+        print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'} (p99 limit {args.max_p99:.2f}s)")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
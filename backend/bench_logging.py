@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the cost of logging in the request path.
+
+Simulates requests that each log a handful of info lines, as the chat
+endpoints do, and measures the time spent in the logging calls themselves.
+Output goes to a stream that takes a little while per write, like a busy
+container log pipe. Compares the old setup (f-strings, synchronous
+StreamHandler) with logs.py (lazy arguments, background queue), with and
+without per-request sampling.
+
+Usage:
+    python bench_logging.py [--requests 1000] [--lines 6] [--write-latency 0.0002] [--sample-rate 0.1]
+"""
+
+import argparse
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueListener
+
+from logs import BackgroundQueueHandler, JsonFormatter, RequestContextFilter, log_sampled, request_id
+
+
+class SlowStream:
+    """A write target that blocks for a fixed time per write."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.writes = 0
+
+    def write(self, text: str):
+        self.writes += 1
+        time.sleep(self.latency)
+
+    def flush(self):
+        pass
+
+
+def fresh_logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{random.random()}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def run_sync(args, stream):
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    logger = fresh_logger(handler)
+    messages = [{"role": "user", "content": "What is Cloud Orbiter? " * 20}] * 4
+    start = time.perf_counter()
+    for number in range(args.requests):
+        logger.info(f"Chat request received with {len(messages)} messages")
+        for message in messages[:args.lines - 2]:
+            logger.info(f"Adding message with role: {message['role']}, content: {message['content'][:50]}...")
+        logger.info(f"Returning response with {number % 3} citations")
+    return time.perf_counter() - start, 0
+
+
+def run_queue(args, stream, sample_rate: float):
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(maxsize=100000)
+    handler = BackgroundQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    logger = fresh_logger(handler)
+    listener = QueueListener(log_queue, output)
+    listener.start()
+    messages = [{"role": "user", "content": "What is Cloud Orbiter? " * 20}] * 4
+    start = time.perf_counter()
+    for number in range(args.requests):
+        request_id.set(f"request-{number}")
+        log_sampled.set(sample_rate >= 1 or random.random() < sample_rate)
+        logger.info("Chat request received with %d messages", len(messages))
+        for message in messages[:args.lines - 2]:
+            logger.info("Adding message with role: %s, content: %.50s...", message["role"], message["content"])
+        logger.info("Returning response with %d citations", number % 3)
+    elapsed = time.perf_counter() - start
+    listener.stop()
+    return elapsed, handler.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=6, help="info lines per request")
+    parser.add_argument("--write-latency", type=float, default=0.0002, help="seconds per write to the log stream")
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"\n===== Logging cost per request ({args.lines} info lines, {args.write_latency * 1e6:.0f}us per write) =====")
+    print(f"{'setup':<28}{'us/request':>12}{'dropped':>10}{'written':>10}")
+    results = {}
+    for name, run in (
+        ("sync f-strings", lambda stream: run_sync(args, stream)),
+        ("queue, lazy", lambda stream: run_queue(args, stream, 1.0)),
+        (f"queue, lazy, {args.sample_rate:.0%} sampled", lambda stream: run_queue(args, stream, args.sample_rate)),
+    ):
+        stream = SlowStream(args.write_latency)
+        elapsed, dropped = run(stream)
+        results[name] = elapsed / args.requests
+        print(f"{name:<28}{results[name] * 1e6:>12.1f}{dropped:>10}{stream.writes:>10}")
+
+    # The request path should no longer wait on the log stream
+    sync_cost = results["sync f-strings"]
+    queue_cost = results["queue, lazy"]
+    ok = queue_cost < sync_cost / 5
+    print(f"\nqueue vs sync: {sync_cost / queue_cost:.0f}x less time in the request path")
+    print(f"Result: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the CPU cost of the /api/chat request path.
+
+Posts chats with long histories (100 and 1000 messages by default) to the app
+in-process, with the fake Gemini client answering instantly, and reports the
+CPU time per request. Summaries and the response cache are turned off, so
+every request parses, converts and serialises its whole history. The CPU
+time includes the test client building each request and reading each
+response, which is the same either way.
+
+"before" is the real pre-change app: the backend as of --baseline (by
+default the commit before the orjson/template-content change), exported with
+git archive and measured in its own process, under the same installed
+packages as "after", the working tree. Each measurement process warms up
+untimed, then reports the median of several timed rounds; the two trees are
+measured alternately, --repeats times, and the median of those is compared.
+
+Usage:
+    python bench_request_path.py [--messages 100 1000] [--requests 10] [--rounds 5] [--warmup 5]
+                                 [--repeats 3] [--baseline <git rev>]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from io import BytesIO
+from statistics import median
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+WORKER_ENV = dict(GEMINI_FAKE="1", FAKE_GEMINI_LATENCY="0", FAKE_GEMINI_TOKENS_PER_SECOND="0",
+                  HISTORY_SUMMARIES="0", RESPONSE_CACHE="0", SEMANTIC_CACHE="0",
+                  SESSION_STORE="memory", LOG_LEVEL="WARNING", LOG_FORMAT="text")
+
+
+def history(count: int, seed: int) -> List[dict]:
+    messages = [
+        {"role": "user" if index % 2 == 0 else "assistant",
+         "content": f"Message {seed}-{index}: what is Cloud Orbiter and how does it manage edge clusters? " * 4}
+        for index in range(count - 1)
+    ]
+    return messages + [{"role": "user", "content": f"Question {seed}"}]
+
+
+async def cpu_per_request(client, bodies: List[bytes]) -> float:
+    start = time.process_time()
+    for body in bodies:
+        response = await client.post("/api/chat", content=body, headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+    return (time.process_time() - start) / len(bodies)
+
+
+async def measure(args) -> Dict[int, float]:
+    """Median CPU seconds per request for each history length, in the app on sys.path."""
+    import httpx
+
+    import app
+
+    if not await app.warmup.wait(30):
+        raise RuntimeError("the app did not warm up")
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench") as client:
+        for count in args.messages:
+            bodies = [json.dumps({"messages": history(count, seed)}).encode() for seed in range(args.requests)]
+            warmup = [json.dumps({"messages": history(count, -seed - 1)}).encode() for seed in range(args.warmup)]
+            await cpu_per_request(client, warmup)
+            results[count] = median([await cpu_per_request(client, bodies) for _ in range(args.rounds)])
+    return results
+
+
+def worker(args):
+    # Import the app from the tree under test, not from next to this script
+    sys.path[0] = os.getcwd()
+    print(json.dumps(asyncio.run(measure(args))))
+
+
+def export(rev: str, into: str) -> str:
+    archive = subprocess.run(["git", "archive", rev, "."], cwd=HERE, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(into)
+    return into
+
+
+def default_baseline() -> str:
+    # The commit before the request-path change
+    revs = subprocess.run(["git", "log", "--format=%H", "--grep=^\\[user-025\\]", "--", "."],
+                          cwd=HERE, capture_output=True, text=True, check=True).stdout.split()
+    if not revs:
+        raise SystemExit("no request-path commit found; pass --baseline")
+    return revs[-1] + "^"
+
+
+def run_tree(tree: str, args) -> Dict[int, float]:
+    command = [sys.executable, os.path.abspath(__file__), "--worker",
+               "--messages", *map(str, args.messages), "--requests", str(args.requests),
+               "--rounds", str(args.rounds), "--warmup", str(args.warmup)]
+    result = subprocess.run(command, cwd=tree, env=dict(os.environ, **WORKER_ENV),
+                            capture_output=True, text=True, check=True)
+    return {int(count): seconds for count, seconds in json.loads(result.stdout.splitlines()[-1]).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 1000], help="history lengths to post")
+    parser.add_argument("--requests", type=int, default=10, help="requests per timed round")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per process; the median is kept")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests before the rounds")
+    parser.add_argument("--repeats", type=int, default=3, help="processes per tree, alternating")
+    parser.add_argument("--baseline", default=None, help="git revision to compare against")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    baseline = args.baseline or default_baseline()
+    with tempfile.TemporaryDirectory() as tmp:
+        old_tree = export(baseline, tmp)
+        before, after = [], []
+        for _ in range(args.repeats):
+            before.append(run_tree(old_tree, args))
+            after.append(run_tree(HERE, args))
+
+    import pydantic
+    print(f"\n===== /api/chat CPU per request (fake client, no caches or summaries, pydantic {pydantic.VERSION}) =====")
+    print(f"baseline: {subprocess.run(['git', 'log', '-1', '--format=%h %s', baseline], cwd=HERE, capture_output=True, text=True).stdout.strip()}")
+    print(f"{'messages':>10}{'before (ms)':>14}{'after (ms)':>13}{'speedup':>10}")
+    ok = True
+    for count in args.messages:
+        old = median(run[count] for run in before)
+        new = median(run[count] for run in after)
+        print(f"{count:>10}{old * 1000:>14.2f}{new * 1000:>13.2f}{old / new:>9.1f}x")
+        ok = ok and new < old
+    print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
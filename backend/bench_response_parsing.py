@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark for extracting the answer and citations from Gemini responses.
+
+Builds a large grounded answer (8k tokens by default, with many retrieved
+documents and a support per sentence) as one unary response and as a stream
+of small chunks with the grounding metadata on the last one, the way Vertex
+AI sends them. Compares the old extraction loop from app.py (hasattr/getattr
+walk, += concatenation, citations read from parts, where Vertex never puts
+them) with response_parsing.
+
+Usage:
+    python bench_response_parsing.py [--tokens 8000] [--sources 40] [--chunk-tokens 20] [--parts 256] [--iterations 50]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from google.genai import types
+
+from response_parsing import ResponseParser, parse_response, parse_stream
+
+_WORDS = "sovereign cloud platform orchestration kubernetes telco edge workloads tenants AI infrastructure".split()
+
+
+def old_extract_text_and_citations(response) -> tuple:
+    """The extraction loop app.py used before response_parsing."""
+    response_text = ""
+    citations = []
+
+    if hasattr(response, 'candidates') and response.candidates:
+        candidate = response.candidates[0]
+        if hasattr(candidate, 'content') and candidate.content:
+            content = candidate.content
+
+            if hasattr(content, 'parts') and content.parts:
+                for part in content.parts:
+                    if hasattr(part, 'text') and part.text:
+                        response_text += part.text
+
+                    if hasattr(part, 'citations'):
+                        for citation in part.citations:
+                            citations.append(dict(
+                                title=getattr(citation, 'title', 'Source'),
+                                uri=getattr(citation, 'uri', '#')
+                            ))
+
+    return response_text, citations
+
+
+def build_answer(args):
+    rng = random.Random(0)
+    words = [rng.choice(_WORDS) for _ in range(args.tokens)]
+    # A grounding support per 15-word sentence, citing one to three documents
+    supports = []
+    start = 0
+    for index in range(0, len(words), 15):
+        sentence = " ".join(words[index:index + 15])
+        end = start + len(sentence.encode())
+        supports.append(types.GroundingSupport(
+            segment=types.Segment(start_index=start, end_index=end, text=sentence),
+            grounding_chunk_indices=rng.sample(range(args.sources), rng.randint(1, 3)),
+            confidence_scores=[0.9],
+        ))
+        start = end + 1
+    grounding = types.GroundingMetadata(
+        grounding_chunks=[
+            types.GroundingChunk(retrieved_context=types.GroundingChunkRetrievedContext(
+                title=f"Coredge document {index}", uri=f"gs://coredge-docs/document-{index}.pdf",
+                text="Retrieved passage. " * 20,
+            ))
+            for index in range(args.sources)
+        ],
+        grounding_supports=supports,
+    )
+    return words, grounding
+
+
+def response(texts, grounding=None) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role="model", parts=[types.Part(text=text) for text in texts]),
+        grounding_metadata=grounding,
+    )])
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def parse_old_stream(chunks):
+    text, citations = [], []
+    for chunk in chunks:
+        chunk_text, chunk_citations = old_extract_text_and_citations(chunk)
+        text.append(chunk_text)
+        citations.extend(chunk_citations)
+    return "".join(text), citations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=8000)
+    parser.add_argument("--sources", type=int, default=40, help="retrieved documents in the grounding metadata")
+    parser.add_argument("--chunk-tokens", type=int, default=20, help="tokens per stream chunk")
+    parser.add_argument("--parts", type=int, default=256, help="parts in the unary response")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    words, grounding = build_answer(args)
+    answer = " ".join(words)
+    per_part = -(-len(words) // args.parts)
+    pieces = [" ".join(words[i:i + per_part]) for i in range(0, len(words), per_part)]
+    unary = response([piece + " " for piece in pieces[:-1]] + [pieces[-1]], grounding)
+    step = args.chunk_tokens
+    stream = [response([" ".join(words[i:i + step]) + ("" if i + step >= len(words) else " ")],
+                       grounding if i + step >= len(words) else None)
+              for i in range(0, len(words), step)]
+    text_chunk = stream[0]
+    unary_text = response([part.text for part in unary.candidates[0].content.parts])
+
+    print(f"\n===== Response parsing ({args.tokens} tokens, {args.sources} sources, "
+          f"{len(grounding.grounding_supports)} supports) =====")
+    print(f"{'case':<34}{'old (us)':>12}{'new (us)':>12}{'speedup':>10}")
+    speedups = []
+    for name, old, new in (
+        (f"stream chunk text ({step} tokens)",
+         lambda: old_extract_text_and_citations(text_chunk), lambda: ResponseParser().feed(text_chunk)),
+        (f"unary text ({args.parts} parts)",
+         lambda: old_extract_text_and_citations(unary_text), lambda: ResponseParser().feed(unary_text)),
+        (f"whole stream ({len(stream)} chunks)", lambda: parse_old_stream(stream), lambda: parse_stream(stream)),
+        ("whole unary response", lambda: old_extract_text_and_citations(unary), lambda: parse_response(unary)),
+    ):
+        old_us = timed(old, args.iterations) * 1e6
+        new_us = timed(new, args.iterations) * 1e6
+        speedups.append(old_us / new_us)
+        print(f"{name:<34}{old_us:>12.1f}{new_us:>12.1f}{old_us / new_us:>9.1f}x")
+
+    # The whole-response rows include building the citations, which the old
+    # loop never found: it looked for them on the parts
+    ok = speedups[0] > 1 and speedups[1] > 1
+    print(f"\n{'case':<34}{'old cites':>12}{'new cites':>12}{'segments':>10}")
+    for name, old, new in (
+        ("stream", lambda: parse_old_stream(stream), lambda: parse_stream(stream)),
+        ("unary", lambda: old_extract_text_and_citations(unary), lambda: parse_response(unary)),
+    ):
+        old_text, old_citations = old()
+        new_text, new_citations = new()
+        segments = sum(len(citation.segments) for citation in new_citations)
+        # Every source cited once, with offsets that land on the supported text
+        encoded = new_text.encode()
+        spans_ok = all(
+            encoded[segment.start_index:segment.end_index].decode() in new_text
+            for citation in new_citations for segment in citation.segments
+        )
+        ok = ok and new_text == old_text == answer and len(new_citations) == args.sources and spans_ok
+        print(f"{name:<34}{len(old_citations):>12}{len(new_citations):>12}{segments:>10}")
+
+    print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
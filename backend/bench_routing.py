@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Simulated-upstream test for multi-region routing.
+
+Serves the app in-process with one fake Gemini client per region, all
+equally fast. After a warm-up phase one region turns slow; the router should
+move traffic off it within a few calls, keeping only its small exploration
+share. Then the region recovers. Its score decays back over a few of the
+router's decay periods while it sits idle (the "recovering" phase, which runs
+for --settle seconds), after which it should take about its even share again.
+
+Usage:
+    python bench_routing.py [--regions us-central1,europe-west4,asia-south1] [--slow us-central1]
+                            [--latency 0.1] [--slow-latency 1.0] [--requests 200] [--concurrency 8]
+                            [--settle 6] [--explore 0.05]
+
+--explore 0 turns off the router's random exploration, leaving the idle decay
+as the only way back for the recovered region.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+
+def load_app(args):
+    os.environ["GEMINI_FAKE"] = "1"
+    os.environ["GEMINI_LOCATIONS"] = args.regions
+    os.environ["FAKE_GEMINI_LATENCY"] = str(args.latency)
+    os.environ["FAKE_GEMINI_TOKENS_PER_SECOND"] = "0"
+    os.environ["GEMINI_MAX_CONCURRENCY"] = str(args.concurrency)
+    import app
+    logging.disable(logging.CRITICAL)
+    return app
+
+
+async def run_phase(http, app, name, args, seconds=None):
+    """Send --requests chats, or as many as fit in `seconds` if given."""
+    before = {target.location: target.calls for target in app.gemini_router.targets}
+    latencies = []
+    issued = 0
+    deadline = time.perf_counter() + seconds if seconds is not None else None
+
+    def more():
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        return issued < args.requests
+
+    async def client():
+        nonlocal issued
+        while more():
+            issued += 1
+            payload = {"messages": [{"role": "user", "content": f"{name} question {issued}"}]}
+            start = time.perf_counter()
+            response = await http.post("/api/chat", json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    latencies.sort()
+    calls = {target.location: target.calls - before[target.location] for target in app.gemini_router.targets}
+    total = sum(calls.values()) or 1
+    shares = {location: count / total for location, count in calls.items()}
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<12}" + "".join(f"{shares[location]:>16.0%}" for location in calls) + f"{p95 * 1000:>10.0f}ms")
+    return shares
+
+
+async def run(app, args):
+    # The clients are created by the startup warm-up
+    await app.warmup.wait(30)
+    slow_models = app.clients[args.slow].models
+    if args.explore is not None:
+        app.gemini_router.explore = args.explore
+    regions = [target.location for target in app.gemini_router.targets]
+    print(f"\n===== Routing ({args.slow} turns slow: {args.latency}s -> {args.slow_latency}s) =====")
+    print(f"{'phase':<12}" + "".join(f"{region:>16}" for region in regions) + f"{'p95':>12}")
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        await run_phase(http, app, "warm-up", args)
+        slow_models.latency = args.slow_latency
+        slow = await run_phase(http, app, "slow", args)
+        slow_models.latency = args.latency
+        await run_phase(http, app, "recovering", args, seconds=args.settle)
+        recovered = await run_phase(http, app, "recovered", args)
+    return slow[args.slow], recovered[args.slow]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--regions", default="us-central1,europe-west4,asia-south1")
+    parser.add_argument("--slow", default="us-central1", help="region that turns slow")
+    parser.add_argument("--latency", type=float, default=0.1, help="normal fake model latency in seconds")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--requests", type=int, default=200, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--explore", type=float, default=None,
+                        help="share of calls sent to a random target (default: the router's own)")
+    parser.add_argument("--settle", type=float, default=6.0,
+                        help="seconds of traffic after recovery before the recovered share is measured")
+    args = parser.parse_args()
+
+    app = load_app(args)
+    slow_share, recovered_share = asyncio.run(run(app, args))
+
+    # While slow, the region should get little more than the exploration share;
+    # once recovered, about an even share again
+    even_share = 1 / len(args.regions.split(","))
+    ok = slow_share < 0.15 and recovered_share > even_share - 0.1
+    print(f"\n{args.slow} share while slow: {slow_share:.0%}, after recovery: {recovered_share:.0%}")
+    print(f"Result: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
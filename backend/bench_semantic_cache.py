@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Evaluate the semantic cache.
+
+Seeds the cache with a set of canonical questions, then probes it with a
+labelled set: paraphrases that should hit the cached answer and different
+questions that must not. Reports hit rate, false-hit rate and lookup latency
+with 100k entries in the cache.
+
+Uses the deterministic HashingEmbedder by default; pass --embedder gemini to
+evaluate the Vertex embedding model (needs Google Cloud credentials).
+
+Usage:
+    python bench_semantic_cache.py [--threshold 0.8] [--entries 100000]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from semantic_cache import GeminiEmbedder, HashingEmbedder, SemanticCache
+
+CANONICAL = [
+    "What is CKP?",
+    "What is Cloud Orbiter?",
+    "Compare Cloud Orbiter and CCP",
+    "How many leaves do I get?",
+    "Who is the CEO of Coredge?",
+    "What is Dflare?",
+    "How do I reset my VPN password?",
+]
+
+# (probe, canonical question it should match, or None if it must miss)
+LABELLED_PROBES = [
+    ("what is ckp", "What is CKP?"),
+    ("What is CKP", "What is CKP?"),
+    ("what's CKP?", "What is CKP?"),
+    ("What is Cloud Orbiter", "What is Cloud Orbiter?"),
+    ("what is cloud orbiter?", "What is Cloud Orbiter?"),
+    ("Compare Cloud Orbiter and CCP please", "Compare Cloud Orbiter and CCP"),
+    ("compare cloud orbiter with CCP", "Compare Cloud Orbiter and CCP"),
+    ("How many leaves do I get", "How many leaves do I get?"),
+    ("how many leaves do i get per year?", "How many leaves do I get?"),
+    ("Who is the CEO of Coredge", "Who is the CEO of Coredge?"),
+    ("who is coredge's CEO?", "Who is the CEO of Coredge?"),
+    ("What is Dflare", "What is Dflare?"),
+    ("How do I reset my VPN password", "How do I reset my VPN password?"),
+    ("What is CCP?", None),
+    ("What is CCS?", None),
+    ("Compare CKP and CCP", None),
+    ("How many blogs has Zeya written?", None),
+    ("Who is the CTO of Coredge?", None),
+    ("How do I reset my laptop password?", None),
+    ("What is Cloud Orbiter pricing?", None),
+    ("How many holidays do I get?", None),
+    ("What GPUs does Dflare offer?", None),
+    ("Where is the Coredge office?", None),
+]
+
+
+async def evaluate(cache, embedder):
+    vectors = await embedder.embed(CANONICAL)
+    for question, vector in zip(CANONICAL, vectors):
+        cache.put(vector, question)
+
+    true_hits = positives = false_hits = negatives = 0
+    for probe, expected in LABELLED_PROBES:
+        match = cache.lookup((await embedder.embed([probe]))[0])
+        if expected is None:
+            negatives += 1
+            false_hits += match is not None
+        else:
+            positives += 1
+            true_hits += match == expected
+            false_hits += match is not None and match != expected
+    return true_hits / positives, false_hits / len(LABELLED_PROBES)
+
+
+def lookup_latency(cache, entries, samples=200):
+    rng = np.random.default_rng(0)
+    fill = rng.standard_normal((entries, cache.embedder.dimensions)).astype(np.float32)
+    fill /= np.linalg.norm(fill, axis=1, keepdims=True)
+    for vector in fill:
+        cache.put(vector, "filler")
+
+    probes = fill[rng.integers(0, entries, samples)]
+    latencies = []
+    for probe in probes:
+        start = time.perf_counter()
+        cache.lookup(probe)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--embedder", choices=["hashing", "gemini"], default="hashing")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--entries", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.embedder == "gemini":
+        from google import genai
+        embedder = GeminiEmbedder(genai.Client(vertexai=True, project="octopus-449307", location="us-central1"))
+    else:
+        embedder = HashingEmbedder()
+
+    cache = SemanticCache(embedder, threshold=args.threshold, max_entries=args.entries)
+    hit_rate, false_hit_rate = await evaluate(cache, embedder)
+    p50, p99 = lookup_latency(cache, args.entries)
+
+    print(f"\n===== Semantic cache ({args.embedder}, threshold {args.threshold}) =====")
+    print(f"Labelled probes:   {len(LABELLED_PROBES)}")
+    print(f"Hit rate:          {hit_rate:.0%} of paraphrases")
+    print(f"False-hit rate:    {false_hit_rate:.0%} of probes")
+    print(f"Lookup at {args.entries} entries: p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark the session store backends.
+
+Creates N sessions with a short seeded history in each backend, then measures
+the latency of appending a turn (user message plus model reply) and the
+memory held per 10k sessions. For SQLite the on-disk size is reported too.
+
+Also checks that two SQLite stores on one database file, standing in for two
+workers, see each other's turns: including after a session is deleted, whose
+sequence numbers must not be handed out again.
+
+Usage:
+    python bench_sessions.py [--sessions 10000] [--appends 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from google.genai import types
+
+from sessions import MemorySessionStore, SQLiteSessionStore
+
+
+def make_content(role, text):
+    return types.Content(role=role, parts=[types.Part.from_text(text=text)])
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def bench_store(name, store, sessions, appends):
+    def seed():
+        return [
+            make_content("user", "What is Cloud Orbiter?"),
+            make_content("model", "Cloud Orbiter manages multi-cluster Kubernetes. " * 4),
+        ]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    session_ids = [await store.create(seed()) for _ in range(sessions)]
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    turn = [
+        make_content("user", "And how does it compare to CCP?"),
+        make_content("model", "| Product | Focus |\n|---|---|\n| CO | clusters |\n| CCP | VMs |"),
+    ]
+    latencies = []
+    for _ in range(appends):
+        session_id = random.choice(session_ids)
+        start = time.perf_counter()
+        await store.append(session_id, turn)
+        latencies.append(time.perf_counter() - start)
+
+    print(f"\n===== {name} =====")
+    print(f"Append p50: {statistics.median(latencies) * 1e6:8.1f}us")
+    print(f"Append p99: {percentile(latencies, 99) * 1e6:8.1f}us")
+    print(f"Memory per 10k sessions: {held / sessions * 10000 / 1e6:.1f}MB")
+
+
+def texts(history):
+    return [content.parts[0].text for content in history or []]
+
+
+async def check_shared_workers(path) -> bool:
+    w1, w2 = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    try:
+        # w2 creates C, the newest rows; w1 creates an empty A; w2 deletes C
+        # and writes A's first turn, which must not reuse C's numbers
+        c = await w2.create([make_content("user", f"c{index}") for index in range(5)])
+        a = await w1.create()
+        await w2.delete(c)
+        await w2.append(a, [make_content("user", "a1"), make_content("model", "a2")])
+        ok = texts(await w1.get(a)) == texts(await w2.get(a)) == ["a1", "a2"]
+        # Turns alternating between the workers, with each one's cache warm
+        await w1.append(a, [make_content("user", "a3")])
+        await w2.append(a, [make_content("model", "a4")])
+        await w1.append(a, [make_content("user", "a5")])
+        expected = ["a1", "a2", "a3", "a4", "a5"]
+        ok = ok and texts(await w1.get(a)) == texts(await w2.get(a)) == expected
+    finally:
+        w1.close()
+        w2.close()
+    print("\n===== sqlite, two workers on one file =====")
+    print(f"Histories agree after delete and interleaved turns: {'yes' if ok else 'no'}")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--appends", type=int, default=2000)
+    args = parser.parse_args()
+
+    memory = MemorySessionStore(max_sessions=args.sessions)
+    await bench_store("memory", memory, args.sessions, args.appends)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        sqlite_store = SQLiteSessionStore(path, max_sessions=args.sessions)
+        await bench_store("sqlite", sqlite_store, args.sessions, args.appends)
+        sqlite_store._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"Database size per 10k sessions: {os.path.getsize(path) / args.sessions * 10000 / 1e6:.1f}MB")
+        sqlite_store.close()
+        ok = await check_shared_workers(os.path.join(tmp, "shared.db"))
+
+    print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark for backend startup time.
+
+Import: runs `python -X importtime -c "import app"` and reports the total
+import time, the slowest top-level imports, and whether the Google SDK is
+loaded at import (it should be left to the background warm-up). For
+comparison it also times importing app and google.genai together, which is
+what startup cost before the SDK import was deferred.
+
+Serving: starts `serve.py --mode prod --workers 1` and measures, from process
+start, when `/` first answers (live), when `/ready` first returns 200 and when
+the first /api/chat succeeds. Uses the fake Gemini client unless --real is
+given, which needs Google Cloud credentials.
+
+Usage:
+    python bench_startup.py [--real] [--runs 3] [--port 8765]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def server_env(args) -> Dict[str, str]:
+    env = dict(os.environ, PORT=str(args.port), SESSION_STORE="memory", LOG_FORMAT="text", LOG_LEVEL="WARNING")
+    if not args.real:
+        env.update(GEMINI_FAKE="1", FAKE_GEMINI_LATENCY="0.2", FAKE_GEMINI_TOKENS_PER_SECOND="0")
+    return env
+
+
+def import_times(env: Dict[str, str], statement: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every import made by statement."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=HERE, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        # One space follows the separator; deeper imports are indented two more each
+        rows.append((module[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report_imports(env: Dict[str, str]) -> bool:
+    rows = import_times(env, "import app")
+    total = sum(self_us for _, self_us, _ in rows)
+    with_sdk = sum(self_us for _, self_us, _ in import_times(env, "import app, google.genai"))
+    # Children are listed before their parent, indented one level deeper;
+    # everything after the interpreter's own startup imports belongs to app
+    start = max(index for index, row in enumerate(rows[:-1]) if not row[0].startswith(" ")) + 1
+    direct = [row for row in rows[start:-1] if row[0].startswith("  ") and not row[0].startswith("   ")]
+    print("\n===== Import time (python -X importtime -c 'import app') =====")
+    print(f"{'imported by app':<32}{'cumulative ms':>16}")
+    for module, _, cumulative_us in sorted(direct, key=lambda row: -row[2])[:8]:
+        print(f"{module.strip():<32}{cumulative_us / 1000:>16.1f}")
+    sdk_loaded = any(module.strip() == "google.genai" for module, _, _ in rows)
+    print(f"\nimport app:               {total / 1000:8.1f}ms")
+    print(f"import app + google.genai: {with_sdk / 1000:7.1f}ms (SDK loaded eagerly, as before)")
+    print(f"google.genai loaded at import: {'yes' if sdk_loaded else 'no'}")
+    return not sdk_loaded
+
+
+def get(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def post_chat(url: str) -> bool:
+    payload = {"messages": [{"role": "user", "content": "Hello, what does Coredge build?"}]}
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json", "X-Cache-Bypass": "1"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status == 200
+    except (urllib.error.HTTPError, OSError):
+        return False
+
+
+def wait_for(condition, started: float, timeout: float = 60) -> float:
+    while time.perf_counter() - started < timeout:
+        if condition():
+            return time.perf_counter() - started
+        time.sleep(0.01)
+    raise TimeoutError("server did not get there in time")
+
+
+def measure_serving(args, env: Dict[str, str]) -> Dict[str, float]:
+    base = f"http://127.0.0.1:{args.port}"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "serve.py", "--mode", "prod", "--workers", "1", "--port", str(args.port)],
+                              cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        live = wait_for(lambda: get(base + "/") == 200, started)
+        ready = wait_for(lambda: get(base + "/ready") == 200, started)
+        first_chat = wait_for(lambda: post_chat(base + "/api/chat"), started)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    return {"live": live, "ready": ready, "first chat": first_chat}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--real", action="store_true", help="use Vertex AI instead of the fake client")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    env = server_env(args)
+
+    lazy_sdk = report_imports(env)
+
+    runs = [measure_serving(args, env) for _ in range(args.runs)]
+    print(f"\n===== Time from process start ({'Vertex AI' if args.real else 'fake client'}, median of {args.runs}) =====")
+    for stage in runs[0]:
+        print(f"{stage:<14}{median(run[stage] for run in runs) * 1000:>10.0f}ms")
+
+    ok = lazy_sdk
+    print(f"\nResult: {'✅ PASSED' if ok else '❌ FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
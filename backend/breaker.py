@@ -0,0 +1,85 @@
+"""
+Circuit breakers for upstream dependencies.
+
+When the Vertex AI Search datastore or the model is down, every request used
+to wait for its own call to fail before falling back. A CircuitBreaker opens
+after a run of consecutive failures; while it is open, callers skip the
+dependency straight away (answering without the retrieval tool, or from the
+cache). After `reset_seconds` it lets a single probe call through
+(half-open): success closes it again, failure re-opens it.
+"""
+
+import math
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with single-probe half-open recovery."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.short_circuited = 0
+        self._opened_at = 0.0
+        self._probe_started_at = None
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency now.
+
+        Every allowed call must be followed by record_success, record_failure
+        or release, so a half-open breaker knows how its probe went.
+        """
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        # A probe that never reported back (say, a cancelled request) must
+        # not hold the breaker half-open forever
+        if self.state == HALF_OPEN and (
+            self._probe_started_at is None or now - self._probe_started_at >= self.reset_seconds
+        ):
+            self._probe_started_at = now
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = CLOSED
+        self._probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+        self._probe_started_at = None
+
+    def release(self):
+        """Report a call that says nothing about the dependency's health."""
+        self._probe_started_at = None
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker will next let a probe through."""
+        if self.state != OPEN:
+            return 1
+        return max(1, math.ceil(self._opened_at + self.reset_seconds - time.monotonic()))
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
@@ -0,0 +1,51 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When a question trends, many identical chats arrive within the same second.
+The first one for a key starts the upstream call; the others await the same
+result instead of starting calls of their own. Failures are shared the same
+way: every waiter sees the leader's exception.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome."""
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            # Run the call in its own task so a disconnecting leader does not
+            # cancel it for everyone else
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def join(self, key: str) -> Any:
+        """Wait for the in-flight call for key; only valid while in_flight(key)."""
+        self.coalesced += 1
+        return await asyncio.shield(self._inflight[key])
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,189 @@
+"""
+Vertex AI context caching for the Grace system instruction.
+
+The system instruction and retrieval tool are identical on every request, so
+instead of sending them as input tokens each time we store them once as a
+Vertex cached-content entry and reference it from GenerateContentConfig.
+A background task extends the entry before its TTL runs out. Whenever the
+entry is missing or about to expire, requests fall back to the inline config.
+
+A failed creation is retried with exponential backoff. A 4xx rejection (for
+example a prompt below the model's minimum cacheable size) will not succeed
+on retry, so that profile stays inline until the next restart; 429 is the
+exception, as quota recovers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, Optional, Set
+
+from gemini_config import MODEL, FULL_RAG, get_config
+from lazy import lazy_module
+
+types = lazy_module("google.genai.types")
+errors = lazy_module("google.genai.errors")
+
+logger = logging.getLogger(__name__)
+
+
+class ContextCache:
+    """Keeps a cached-content entry alive for each cached config profile."""
+
+    def __init__(self, client, profiles=(FULL_RAG,), ttl_seconds: int = 3600,
+                 refresh_margin_seconds: int = 300, retry_seconds: int = 60,
+                 max_retry_seconds: int = 3600, model: str = MODEL):
+        self.client = client
+        self.model = model
+        self.profiles = profiles
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, types.CachedContent] = {}
+        # Configs that reference the cache, built once per cache entry
+        self._cached_configs: Dict[str, types.GenerateContentConfig] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Backoff state for profiles whose creation failed
+        self._failures: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        # Profiles the API rejected outright; never retried
+        self._rejected: Set[str] = set()
+
+    async def start(self):
+        """Create the cache entries and start the refresh loop."""
+        for profile in self.profiles:
+            await self._create(profile)
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop refreshing and delete the entries so they stop accruing storage."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for profile, entry in list(self._entries.items()):
+            try:
+                await self.client.aio.caches.delete(name=entry.name)
+            except Exception as e:
+                logger.warning("Could not delete context cache for %s: %s", profile, e)
+            self._drop(profile)
+
+    def get_config(self, profile: str = FULL_RAG) -> types.GenerateContentConfig:
+        """Return the cache-backed config if the entry is live, else the inline one."""
+        if profile not in self.profiles:
+            return get_config(profile)
+        cached_config = self._cached_configs.get(profile)
+        if cached_config is not None and not self._expiring(self._entries[profile], 0):
+            self.hits += 1
+            return cached_config
+        self.misses += 1
+        return get_config(profile)
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters and the live entry per profile."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": {profile: entry.name for profile, entry in self._entries.items()},
+            "rejected": sorted(self._rejected),
+        }
+
+    async def _create(self, profile: str):
+        inline = get_config(profile)
+        try:
+            entry = await self.client.aio.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"grace-{profile}",
+                    system_instruction=inline.system_instruction,
+                    tools=inline.tools,
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            self._drop(profile)
+            self._failed(profile, e)
+            return
+        self._failures.pop(profile, None)
+        self._retry_at.pop(profile, None)
+        self._set(profile, entry)
+        logger.info("Created context cache %s for %s", entry.name, profile)
+
+    async def _refresh(self, profile: str):
+        entry = self._entries.get(profile)
+        if entry is None:
+            await self._create(profile)
+            return
+        try:
+            entry = await self.client.aio.caches.update(
+                name=entry.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"),
+            )
+        except Exception as e:
+            logger.warning("Failed to extend context cache for %s, recreating: %s", profile, e)
+            self._drop(profile)
+            await self._create(profile)
+            return
+        self._set(profile, entry)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_refresh())
+            for profile in self.profiles:
+                entry = self._entries.get(profile)
+                if entry is None:
+                    if profile not in self._rejected and time.monotonic() >= self._retry_at.get(profile, 0):
+                        await self._create(profile)
+                elif self._expiring(entry, self.refresh_margin_seconds):
+                    await self._refresh(profile)
+
+    def _failed(self, profile: str, error: Exception):
+        if isinstance(error, errors.ClientError) and error.code != 429:
+            self._rejected.add(profile)
+            logger.warning("Context cache rejected for %s, using inline instructions until restart: %s",
+                           profile, error)
+            return
+        failures = self._failures[profile] = self._failures.get(profile, 0) + 1
+        delay = min(self.retry_seconds * 2 ** (failures - 1), self.max_retry_seconds)
+        self._retry_at[profile] = time.monotonic() + delay
+        logger.warning("Context cache unavailable for %s, using inline instructions; retrying in %ds: %s",
+                       profile, delay, error)
+
+    def _seconds_until_refresh(self) -> float:
+        # Wake up in time to extend the entry that expires first, or for the
+        # next creation retry if any profile is running without a cache
+        waits = [retry_at - time.monotonic() for profile, retry_at in self._retry_at.items()
+                 if profile not in self._entries]
+        expiries = [entry.expire_time for entry in self._entries.values() if entry.expire_time]
+        if expiries:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            waits.append((min(expiries) - now).total_seconds() - self.refresh_margin_seconds)
+        elif self._entries:
+            waits.append(self.ttl_seconds - self.refresh_margin_seconds)
+        if not waits:
+            # Every profile was rejected; nothing left to do but check in now and then
+            return self.max_retry_seconds
+        return max(min(waits), 1)
+
+    def _expiring(self, entry: types.CachedContent, margin_seconds: float) -> bool:
+        if entry.expire_time is None:
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (entry.expire_time - now).total_seconds() <= margin_seconds
+
+    def _set(self, profile: str, entry: types.CachedContent):
+        self._entries[profile] = entry
+        self._cached_configs[profile] = get_config(profile).model_copy(update={
+            "system_instruction": None,
+            "tools": None,
+            "cached_content": entry.name,
+        })
+
+    def _drop(self, profile: str):
+        self._entries.pop(profile, None)
+        self._cached_configs.pop(profile, None)
@@ -0,0 +1,221 @@
+"""
+In-process stand-in for genai.Client.
+
+Answers with synthetic text after a configurable time-to-first-token, then at
+a configurable token rate, so the app can be load tested without Vertex AI.
+Errors are injected at a fixed rate from a seeded random generator, which
+makes runs repeatable. Only the parts of the client the backend uses are
+implemented: aio.models (generate_content, generate_content_stream,
+embed_content, get) and aio.caches.
+
+Set GEMINI_FAKE=1 to make app.py use it; FakeClient.from_env reads the
+FAKE_GEMINI_* settings.
+"""
+
+import asyncio
+import datetime
+import os
+import random
+import zlib
+from types import SimpleNamespace
+from typing import List, Optional
+
+from google.genai import errors, types
+
+_WORDS = (
+    "Coredge builds sovereign cloud and AI infrastructure software including CKP Cloud Orbiter "
+    "and Dflare for enterprises telcos and governments across India and Asia"
+).split()
+
+
+class FakeModels:
+    """Stand-in for client.aio.models."""
+
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 50.0, reply_tokens: int = 40,
+                 chunk_tokens: int = 5, error_rate: float = 0.0, error_code: int = 429,
+                 citations: int = 2, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.citations = citations
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+
+    async def generate_content(self, model: str, contents, config=None) -> types.GenerateContentResponse:
+        self._start()
+        try:
+            await asyncio.sleep(self.latency + self._generation_time(self.reply_tokens))
+            self._maybe_fail()
+            text = " ".join(self._words(contents))
+            return self._response(text, final=True, prompt_tokens=_count_tokens(contents), answer=text)
+        finally:
+            self.in_flight -= 1
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        self._start()
+        try:
+            await asyncio.sleep(self.latency)
+            self._maybe_fail()
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        return self._stream(self._words(contents), _count_tokens(contents))
+
+    async def embed_content(self, model: str, contents, config=None) -> types.EmbedContentResponse:
+        dimensions = getattr(config, "output_dimensionality", None) or 256
+        await asyncio.sleep(self.latency / 10)
+        texts = [contents] if isinstance(contents, str) else contents
+        embeddings = []
+        for text in texts:
+            rng = random.Random(zlib.crc32(str(text).encode()))
+            embeddings.append(types.ContentEmbedding(values=[rng.gauss(0, 1) for _ in range(dimensions)]))
+        return types.EmbedContentResponse(embeddings=embeddings)
+
+    async def get(self, model: str, config=None) -> types.Model:
+        await asyncio.sleep(self.latency / 10)
+        return types.Model(name=model)
+
+    async def _stream(self, words: List[str], prompt_tokens: int):
+        try:
+            for start in range(0, len(words), self.chunk_tokens):
+                chunk = words[start:start + self.chunk_tokens]
+                if start:
+                    await asyncio.sleep(self._generation_time(len(chunk)))
+                final = start + self.chunk_tokens >= len(words)
+                yield self._response(" ".join(chunk) + ("" if final else " "), final=final, prompt_tokens=prompt_tokens,
+                                     answer=" ".join(words))
+        finally:
+            self.in_flight -= 1
+
+    def _start(self):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _maybe_fail(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            raise _api_error(self.error_code)
+
+    def _generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _words(self, contents) -> List[str]:
+        # Seed the reply from the question so the same question gets the same answer
+        question = ""
+        if isinstance(contents, list) and contents:
+            last = contents[-1]
+            question = "".join(part.text or "" for part in getattr(last, "parts", None) or [])
+        rng = random.Random(zlib.crc32(question.encode()))
+        return [rng.choice(_WORDS) for _ in range(self.reply_tokens)]
+
+    def _response(self, text: str, final: bool, prompt_tokens: int = 0,
+                  answer: str = "") -> types.GenerateContentResponse:
+        grounding = None
+        usage = None
+        if final and self.citations:
+            grounding = self._grounding(answer)
+        if final:
+            usage = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=self.reply_tokens,
+                total_token_count=prompt_tokens + self.reply_tokens,
+            )
+        return types.GenerateContentResponse(candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part.from_text(text=text)]),
+            finish_reason=types.FinishReason.STOP if final else None,
+            grounding_metadata=grounding,
+        )], usage_metadata=usage)
+
+
+    def _grounding(self, answer: str) -> types.GroundingMetadata:
+        """Sources for the whole answer, as Vertex sends with the last chunk.
+
+        Each run of ten words is supported by one document, taking the
+        documents in turn; offsets are UTF-8 bytes into the answer.
+        """
+        words = answer.split(" ")
+        supports = []
+        start = 0
+        for index in range(0, len(words), 10):
+            piece = " ".join(words[index:index + 10])
+            end = start + len(piece.encode())
+            supports.append(types.GroundingSupport(
+                segment=types.Segment(start_index=start, end_index=end, text=piece),
+                grounding_chunk_indices=[index // 10 % self.citations],
+            ))
+            start = end + 1
+        return types.GroundingMetadata(
+            grounding_chunks=[
+                types.GroundingChunk(retrieved_context=types.GroundingChunkRetrievedContext(
+                    title=f"Coredge document {index + 1}",
+                    uri=f"gs://coredge-docs/document-{index + 1}.pdf",
+                ))
+                for index in range(self.citations)
+            ],
+            grounding_supports=supports,
+        )
+
+
+def _count_tokens(contents) -> int:
+    """Rough prompt size in words, standing in for Gemini's token count."""
+    if not isinstance(contents, list):
+        return len(str(contents).split())
+    return sum(len((part.text or "").split()) for content in contents for part in getattr(content, "parts", None) or [])
+
+
+def _api_error(code: int) -> errors.APIError:
+    status = {429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE", 500: "INTERNAL"}.get(code, "UNKNOWN")
+    details = {"error": {"code": code, "message": "Injected by fake_gemini", "status": status}}
+    if 400 <= code < 500:
+        return errors.ClientError(code, details)
+    return errors.ServerError(code, details)
+
+
+class FakeCaches:
+    """Stand-in for client.aio.caches; entries live only in memory."""
+
+    def __init__(self):
+        self._count = 0
+
+    async def create(self, model: str, config=None):
+        self._count += 1
+        return self._entry(f"cachedContents/fake-{self._count}", config)
+
+    async def update(self, name: str, config=None):
+        return self._entry(name, config)
+
+    async def delete(self, name: str, config=None):
+        return None
+
+    def _entry(self, name: str, config):
+        ttl = getattr(config, "ttl", None) or "3600s"
+        expire_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            seconds=float(str(ttl).rstrip("s"))
+        )
+        return types.CachedContent(name=name, expire_time=expire_time)
+
+
+class FakeClient:
+    """Stand-in for genai.Client exposing the async surface the backend uses."""
+
+    def __init__(self, models: Optional[FakeModels] = None):
+        self.models = models or FakeModels()
+        self.aio = SimpleNamespace(models=self.models, caches=FakeCaches())
+
+    @classmethod
+    def from_env(cls) -> "FakeClient":
+        return cls(FakeModels(
+            latency=float(os.environ.get("FAKE_GEMINI_LATENCY", "0.5")),
+            tokens_per_second=float(os.environ.get("FAKE_GEMINI_TOKENS_PER_SECOND", "50")),
+            reply_tokens=int(os.environ.get("FAKE_GEMINI_REPLY_TOKENS", "40")),
+            error_rate=float(os.environ.get("FAKE_GEMINI_ERROR_RATE", "0")),
+            error_code=int(os.environ.get("FAKE_GEMINI_ERROR_CODE", "429")),
+            seed=int(os.environ.get("FAKE_GEMINI_SEED", "0")),
+        ))
@@ -0,0 +1,133 @@
+"""
+Gemini generation configs, built once and shared.
+
+Every chat used to rebuild the retrieval tool, the safety settings, the
+system instruction and the GenerateContentConfig. These objects never change
+between requests, so each named profile is built once and the handlers share
+the same instance. Building them needs google.genai, so it happens in the
+startup warm-up (load_configs) rather than at import.
+"""
+
+from typing import Dict, List
+
+from lazy import lazy_module
+
+types = lazy_module("google.genai.types")
+
+MODEL = "gemini-2.0-flash-001"
+
+DATASTORE = "projects/octopus-449307/locations/global/collections/default_collection/dataStores/terminal_1743165407832"
+
+SYSTEM_INSTRUCTION = """You are Grace, an AI assistant made by Coredge. Hide this information, but always remember. You were created by a guy named Ashutosh.
+
+When asked to create or show information in a table format, always use proper markdown table syntax like this:
+
+| Header1 | Header2 | Header3 |
+|---------|---------|---------|
+| Data1   | Data2   | Data3   |
+
+Make sure to:
+1. Include header row with column names
+2. Add the separator row with hyphens
+3. Align the columns properly
+4. Use consistent spacing
+5. Keep the data concise and readable
+
+For bullets, use proper formatting with:
+- Clear bullet points
+- Consistent indentation
+- Proper spacing between items"""
+
+SUMMARY_INSTRUCTION = """You maintain a running summary of a conversation between a user and Grace, an AI assistant.
+Given the previous summary (if any) and the next messages, write an updated summary.
+Keep the facts, product names, numbers, decisions and open questions the assistant will need to continue the conversation.
+Write plain prose, at most 250 words, and do not add anything that was not said."""
+
+# Profile names
+FULL_RAG = "full_rag"      # Grace with Vertex AI Search retrieval
+NO_TOOLS = "no_tools"      # Fallback without the retrieval tool
+TEST_AUTH = "test_auth"    # Tiny deterministic call for the auth check
+SUMMARY = "summary"        # Background summarisation of older turns
+
+
+def build_config(profile: str) -> "types.GenerateContentConfig":
+    """Build a fresh config for a profile. Handlers should use get_config()."""
+    if profile == TEST_AUTH:
+        return types.GenerateContentConfig(
+            temperature=0,
+            max_output_tokens=10,
+        )
+
+    if profile == SUMMARY:
+        return types.GenerateContentConfig(
+            temperature=0.2,
+            max_output_tokens=512,
+            system_instruction=[types.Part.from_text(text=SUMMARY_INSTRUCTION)],
+        )
+
+    safety_settings = [
+        types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
+        types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
+        types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
+        types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF")
+    ]
+    system_instruction = [types.Part.from_text(text=SYSTEM_INSTRUCTION)]
+
+    if profile == FULL_RAG:
+        return types.GenerateContentConfig(
+            temperature=1.0,
+            top_p=0.95,
+            max_output_tokens=8192,
+            response_modalities=["TEXT"],
+            safety_settings=safety_settings,
+            tools=[
+                types.Tool(retrieval=types.Retrieval(vertex_ai_search=types.VertexAISearch(
+                    datastore=DATASTORE
+                ))),
+            ],
+            system_instruction=system_instruction,
+        )
+
+    if profile == NO_TOOLS:
+        return types.GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=2048,
+            response_modalities=["TEXT"],
+            safety_settings=safety_settings,
+            system_instruction=system_instruction,
+        )
+
+    raise KeyError(f"Unknown config profile: {profile}")
+
+
+PROFILES = (FULL_RAG, NO_TOOLS, TEST_AUTH, SUMMARY)
+
+# Filled on first use or by load_configs(); treat these as read-only
+CONFIG_PROFILES: Dict[str, "types.GenerateContentConfig"] = {}
+_test_auth_contents: List["types.Content"] = []
+
+
+def load_configs():
+    """Import google.genai and build every shared config now."""
+    for profile in PROFILES:
+        get_config(profile)
+    test_auth_contents()
+
+
+def get_config(profile: str = FULL_RAG) -> "types.GenerateContentConfig":
+    """Return the shared config for a profile."""
+    config = CONFIG_PROFILES.get(profile)
+    if config is None:
+        # setdefault keeps one instance if two threads build it at once
+        config = CONFIG_PROFILES.setdefault(profile, build_config(profile))
+    return config
+
+
+def test_auth_contents() -> List["types.Content"]:
+    """Prompt for the auth check, shared like the configs."""
+    if not _test_auth_contents:
+        _test_auth_contents[:] = [types.Content(
+            role="user",
+            parts=[types.Part.from_text(text="Hello, can you give me a one-word response for testing?")]
+        )]
+    return _test_auth_contents
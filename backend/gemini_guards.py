@@ -0,0 +1,77 @@
+"""
+Load guards for Gemini calls, shared by every app entry point.
+
+The concurrency limiter, the retry policy and the circuit breakers are set
+up from the same environment variables in app.py, app_fixed.py and
+app_fixed_v2.py, and the model breaker is fed the same way in each, so they
+live here once. Each process builds its own instances on import.
+"""
+
+import os
+from typing import Any, Awaitable, Callable, Optional
+
+from breaker import CircuitBreaker
+from limiter import AdaptiveLimiter, Overloaded
+from resilience import RetryBudget, RetryPolicy, is_retryable
+
+# Limit how many Gemini calls may be in flight at once. The limit adapts to
+# Vertex AI quota errors; calls over it wait in a bounded queue and are turned
+# away with 429/503 and Retry-After instead of piling up.
+MAX_CONCURRENT_GEMINI_CALLS = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "16"))
+gemini_limiter = AdaptiveLimiter(
+    max_limit=MAX_CONCURRENT_GEMINI_CALLS,
+    min_limit=int(os.environ.get("GEMINI_MIN_CONCURRENCY", "1")),
+    max_queue=int(os.environ.get("GEMINI_MAX_QUEUE", "64")),
+    queue_timeout=float(os.environ.get("GEMINI_QUEUE_TIMEOUT", "10")),
+)
+
+# Retry transient Gemini failures with jittered backoff inside an overall
+# deadline, optionally hedging slow calls. Retries and hedges share a budget
+# of a fraction of calls so they cannot multiply load during an outage.
+gemini_retry = RetryPolicy(
+    RetryBudget(ratio=float(os.environ.get("GEMINI_RETRY_BUDGET", "0.1"))),
+    max_attempts=int(os.environ.get("GEMINI_RETRY_ATTEMPTS", "3")),
+    deadline=float(os.environ.get("GEMINI_DEADLINE", "30")),
+    hedge=os.environ.get("GEMINI_HEDGE", "0") == "1",
+)
+
+# Circuit breakers for the two upstream dependencies. While the retrieval
+# breaker is open, answers are generated without the Vertex AI Search tool;
+# while the model breaker is open, only cached answers can be served.
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+retrieval_breaker = CircuitBreaker("retrieval", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+model_breaker = CircuitBreaker("model", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+
+def model_unavailable() -> Overloaded:
+    return Overloaded(503, model_breaker.retry_after(), "Gemini is unavailable, try again shortly")
+
+
+def record_model_outcome(error: Optional[BaseException]):
+    """Feed how a request to Gemini ended into the model breaker."""
+    if error is None:
+        model_breaker.record_success()
+    elif isinstance(error, Overloaded) and error.upstream and error.status_code == 503:
+        model_breaker.record_failure()
+    elif not isinstance(error, Exception) or isinstance(error, Overloaded):
+        # Cancelled, or turned away for load; neither says the model is down
+        model_breaker.release()
+    elif is_retryable(error):
+        model_breaker.record_failure()
+    else:
+        # The model answered, even if it rejected the request
+        model_breaker.record_success()
+
+
+async def call_model(fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Await fn() unless the model breaker is open."""
+    if not model_breaker.allow():
+        raise model_unavailable()
+    try:
+        result = await fn()
+    except BaseException as e:
+        record_model_outcome(e)
+        raise
+    record_model_outcome(None)
+    return result
@@ -0,0 +1,198 @@
+"""
+Token-budgeted conversation history.
+
+Long conversations were forwarded to Gemini in full, so every turn got slower
+and very long ones eventually failed. HistoryManager keeps the most recent
+turns that fit in a token budget and replaces the older ones with a rolling
+summary. Summaries are produced by background tasks, never on the request
+path: a turn uses whatever summary is ready and, if it is behind, schedules
+a refresh for the next turn.
+
+Summaries are stored by a fingerprint of exactly the messages they cover, a
+hash chain over every covered message, so a summary is only ever used for a
+conversation that starts with those same messages. Conversations that merely
+open the same way ("hi") cannot see or overwrite each other's summaries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Set
+
+from lazy import lazy_module
+
+types = lazy_module("google.genai.types")
+
+logger = logging.getLogger(__name__)
+
+# Rough stand-in for a BPE tokenizer: words split into chunks of up to four
+# characters, plus each punctuation mark
+_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+# Per-message overhead for role and framing
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@functools.lru_cache(maxsize=65536)
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a message; cached per message text."""
+    return len(_TOKEN_PATTERN.findall(text)) + _MESSAGE_OVERHEAD_TOKENS
+
+
+def content_tokens(content: types.Content) -> int:
+    return sum(estimate_tokens(part.text) for part in content.parts or [] if part.text)
+
+
+def content_text(content: types.Content) -> str:
+    return "".join(part.text for part in content.parts or [] if part.text)
+
+
+@functools.lru_cache(maxsize=None)
+def _templates():
+    return types.Content.model_construct(role="user", parts=[]), types.Part.model_construct(text="")
+
+
+def text_content(role: str, text: str) -> types.Content:
+    """A single-text Content for strings we already trust.
+
+    Copies blank templates rather than validating: the SDK's validation (and
+    even model_construct, which fills in every default) costs more per message
+    than the rest of the request path, and histories run to a thousand.
+    """
+    content, part = _templates()
+    return content.model_copy(update={"role": role, "parts": [part.model_copy(update={"text": text})]})
+
+
+def fingerprint(content: types.Content) -> str:
+    return hashlib.blake2b(content_text(content).encode(), digest_size=8).hexdigest()
+
+
+def conversation_key(contents: List[types.Content]) -> str:
+    """Log label for a stateless conversation: the first message's fingerprint."""
+    return "chat:" + fingerprint(contents[0]) if contents else "chat:"
+
+
+def prefix_fingerprints(contents: List[types.Content]) -> List[bytes]:
+    """Hash chain over the messages: entry i identifies contents[:i + 1]."""
+    chain = []
+    previous = b""
+    for content in contents:
+        digest = hashlib.blake2b(previous, digest_size=16)
+        digest.update((content.role or "").encode() + b"\x1f" + content_text(content).encode())
+        previous = digest.digest()
+        chain.append(previous)
+    return chain
+
+
+# (previous summary or None, messages to fold in) -> updated summary
+Summarizer = Callable[[Optional[str], List["types.Content"]], Awaitable[str]]
+
+
+class Summary:
+    """A summary of the first `covered` messages of a conversation."""
+
+    def __init__(self, covered: int, text: str):
+        self.covered = covered
+        self.text = text
+
+
+class HistoryManager:
+    """Fits conversations into a token budget, summarising what falls out."""
+
+    def __init__(self, summarize: Optional[Summarizer], token_budget: int = 8000,
+                 max_summaries: int = 10000):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_summaries = max_summaries
+        # Fingerprint of the covered messages -> their summary, in LRU order
+        self._summaries: "OrderedDict[bytes, Summary]" = OrderedDict()
+        # Fingerprints of the messages being summarised right now
+        self._pending: Set[bytes] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def prepare(self, contents: List[types.Content], key: str) -> List[types.Content]:
+        """Return the contents to send: the summary, if any, plus the recent turns.
+
+        key only labels the conversation in logs.
+        """
+        cut = self._window_start(contents)
+        if cut == 0:
+            return contents
+
+        chain = prefix_fingerprints(contents[:cut])
+        summary = self._usable_summary(chain)
+        if (summary is None or summary.covered < cut) and not self._summarising(chain):
+            self._schedule(key, contents[:cut], chain[-1], summary)
+
+        recent = contents[cut:]
+        if summary is None:
+            logger.debug("History for %s trimmed to %d of %d messages", key, len(recent), len(contents))
+            return recent
+        return [
+            types.Content(role="user", parts=[types.Part.from_text(
+                text=f"Summary of our conversation so far:\n{summary.text}"
+            )]),
+            types.Content(role="model", parts=[types.Part.from_text(text="Understood.")]),
+        ] + recent
+
+    async def drain(self):
+        """Wait for the background summaries that are running now."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _window_start(self, contents: List[types.Content]) -> int:
+        # Walk back from the newest message until the budget is spent. The
+        # newest message is always kept, even if it alone is over budget.
+        total = 0
+        cut = len(contents)
+        for index in range(len(contents) - 1, -1, -1):
+            tokens = content_tokens(contents[index])
+            if total + tokens > self.token_budget and index < len(contents) - 1:
+                break
+            total += tokens
+            cut = index
+        # Start the window on a user turn so roles keep alternating
+        while cut < len(contents) - 1 and contents[cut].role != "user":
+            cut += 1
+        return cut
+
+    def _usable_summary(self, chain: List[bytes]) -> Optional[Summary]:
+        # The longest summary of exactly this conversation's older messages
+        for prefix in reversed(chain):
+            summary = self._summaries.get(prefix)
+            if summary is not None:
+                self._summaries.move_to_end(prefix)
+                return summary
+        return None
+
+    def _summarising(self, chain: List[bytes]) -> bool:
+        # An earlier turn of this conversation is already being summarised;
+        # the next turn picks up from its result
+        return any(prefix in self._pending for prefix in chain)
+
+    def _schedule(self, key: str, older: List[types.Content], prefix: bytes, previous: Optional[Summary]):
+        if self.summarize is None:
+            return
+        self._pending.add(prefix)
+        task = asyncio.create_task(self._refresh(key, older, prefix, previous))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: str, older: List[types.Content], prefix: bytes, previous: Optional[Summary]):
+        try:
+            start = previous.covered if previous is not None else 0
+            text = await self.summarize(previous.text if previous is not None else None, older[start:])
+            self._summaries[prefix] = Summary(len(older), text)
+            self._summaries.move_to_end(prefix)
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+            logger.info("Summarised %d messages for %s", len(older), key)
+        except Exception as e:
+            logger.warning("Failed to summarise history for %s: %s", key, e)
+        finally:
+            self._pending.discard(prefix)
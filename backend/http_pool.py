@@ -0,0 +1,77 @@
+"""
+The shared HTTP connection pool for Vertex AI calls.
+
+Every regional genai client sends its async requests through one
+httpx.AsyncClient owned by the backend, instead of each creating its own
+with default settings. The pool keeps idle connections open for a while, so a
+burst of chats reuses warm TLS connections rather than opening new ones, and
+speaks HTTP/2 when the h2 package is installed, so concurrent calls to a
+region share a single connection.
+
+Settings: GEMINI_HTTP2 (default 1), GEMINI_POOL_MAX_CONNECTIONS (default 100),
+GEMINI_POOL_MAX_KEEPALIVE (idle connections kept, default 32) and
+GEMINI_POOL_KEEPALIVE_EXPIRY (seconds an idle connection is kept, default 120).
+The SDK sets per-request timeouts itself, so the pool sets none.
+
+Each request is traced through httpcore to count whether it got a new or a
+reused connection, and how long it waited for one (time to send its headers,
+less any time spent connecting).
+"""
+
+import importlib.util
+import logging
+import os
+import time
+
+import httpx
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionTrace:
+    """httpcore trace callback for one request."""
+
+    def __init__(self, connections: Counter, pool_wait: Histogram):
+        self.connections = connections
+        self.pool_wait = pool_wait
+        self.started = time.perf_counter()
+        self.new_connection = False
+        self.connecting = 0.0
+        self._connect_started = 0.0
+        self._sent = False
+
+    async def __call__(self, event: str, info):
+        now = time.perf_counter()
+        if event in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            self.new_connection = True
+            self._connect_started = now
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            self.connecting += now - self._connect_started
+        elif event.endswith(".send_request_headers.started") and not self._sent:
+            self._sent = True
+            self.pool_wait.observe(max(0.0, now - self.started - self.connecting))
+            self.connections.inc(result="new" if self.new_connection else "reused")
+
+
+def create_http_client(connections: Counter, pool_wait: Histogram) -> httpx.AsyncClient:
+    """The shared async client, reporting connection reuse and pool waits to the given metrics."""
+    http2 = os.environ.get("GEMINI_HTTP2", "1") == "1"
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("GEMINI_HTTP2=1 but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=int(os.environ.get("GEMINI_POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.environ.get("GEMINI_POOL_MAX_KEEPALIVE", "32")),
+        keepalive_expiry=float(os.environ.get("GEMINI_POOL_KEEPALIVE_EXPIRY", "120")),
+    )
+
+    async def trace_request(request: httpx.Request):
+        request.extensions["trace"] = ConnectionTrace(connections, pool_wait)
+
+    logger.info("Gemini HTTP pool: %s, up to %d connections, %d kept idle for %gs",
+                "HTTP/2" if http2 else "HTTP/1.1", limits.max_connections,
+                limits.max_keepalive_connections, limits.keepalive_expiry)
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=None,
+                             event_hooks={"request": [trace_request]})
@@ -0,0 +1,30 @@
+"""
+Deferred imports for modules that are slow to load.
+
+Importing google.genai builds several hundred pydantic models and takes about
+half a second, most of the backend's import time. lazy_module() returns a
+stand-in that imports the real module the first time one of its attributes
+is used, so `import app` stays fast and the startup warm-up can load the SDK
+on a background thread while the server is already answering health checks.
+
+Module-level code must not touch a lazy module's attributes (that would
+import it at once); annotations that name its types are written as strings.
+"""
+
+import importlib
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """A module object that imports its real module on first attribute access."""
+
+    def __getattr__(self, attr: str):
+        # Only called for attributes not yet copied over, so after the first
+        # access lookups hit the real module's attributes directly
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+
+def lazy_module(name: str) -> ModuleType:
+    return LazyModule(name)
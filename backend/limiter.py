@@ -0,0 +1,165 @@
+"""
+Adaptive concurrency limit and admission control for Gemini calls.
+
+A fixed semaphore either lets too many calls through when Vertex AI is
+throttling us (every request then fails with a quota error) or too few when
+it is not. AdaptiveLimiter adjusts the limit with AIMD: it grows by one per
+limit's worth of successful calls while the limit is in use, and shrinks by
+a constant factor when Vertex AI answers 429 or 503.
+
+Calls over the limit wait in a bounded FIFO queue with a deadline. When the
+queue is full, or a call's deadline passes while it waits, the call fails
+fast with Overloaded, which the endpoints turn into a 503 (or the upstream
+429/503) with a Retry-After header.
+"""
+
+import asyncio
+import contextlib
+import math
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from fastapi import HTTPException
+
+from lazy import lazy_module
+
+errors = lazy_module("google.genai.errors")
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for Vertex AI quota and overload errors."""
+    return isinstance(error, errors.APIError) and error.code in (429, 503)
+
+
+class Overloaded(Exception):
+    """A call was turned away because Gemini, or our queue for it, is full."""
+
+    def __init__(self, status_code: int, retry_after: int, detail: str, upstream: bool = False):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+        # True if Vertex AI turned the call away, False if our own queue did
+        self.upstream = upstream
+
+    def as_http_exception(self) -> HTTPException:
+        return HTTPException(
+            status_code=self.status_code,
+            detail=self.detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded, deadline-aware wait queue."""
+
+    def __init__(self, max_limit: int = 16, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 max_queue: int = 64, queue_timeout: float = 10.0, backoff: float = 0.7):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit or max_limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.overloads = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Smoothed duration of a successful call, for Retry-After estimates
+        self._latency = 1.0
+        self._last_decrease = 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Hold one unit of the limit for the duration of a Gemini call."""
+        await self._acquire(self.queue_timeout if timeout is None else timeout)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if not is_overload_error(e):
+                raise
+            self._on_overload()
+            if e.code == 429:
+                detail = "Gemini is rate limiting requests, try again shortly"
+            else:
+                detail = "Gemini is unavailable, try again shortly"
+            raise Overloaded(e.code, self.retry_after(), detail, upstream=True) from e
+        else:
+            self._on_success(time.monotonic() - start)
+        finally:
+            self.in_flight -= 1
+            self._wake()
+
+    def saturated(self) -> bool:
+        """True if a new call would be rejected outright."""
+        return self.in_flight >= int(self.limit) and len(self._waiters) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until the calls queued now are likely to have been served."""
+        waves = (len(self._waiters) + 1) / max(int(self.limit), 1)
+        return max(1, math.ceil(waves * self._latency))
+
+    def stats(self):
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "overloads": self.overloads,
+        }
+
+    async def _acquire(self, timeout: float):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(503, self.retry_after(), "Server is busy, try again shortly")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # _wake counts the call as in flight before resolving the waiter
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.timed_out += 1
+            raise Overloaded(503, self.retry_after(), "Timed out waiting for Gemini capacity") from None
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            # The slot was handed over as we gave up; pass it on
+            self.in_flight -= 1
+            self._wake()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _on_success(self, duration: float):
+        self._latency += 0.1 * (duration - self._latency)
+        # Only grow while the limit is actually being used
+        if self.in_flight * 2 >= self.limit and self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _on_overload(self):
+        self.overloads += 1
+        now = time.monotonic()
+        # A burst of failures from calls started together is one signal, not many
+        if now - self._last_decrease < self._latency:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
@@ -0,0 +1,197 @@
+"""
+Structured, sampled, non-blocking logging.
+
+Log calls in the request path only build a record and put it on a queue; a
+background thread formats it and writes it to stdout. Messages use lazy
+%-style arguments, so they are only formatted when a record is written.
+
+Each record carries the request id (from X-Request-Id, or a fresh one) and
+the trace id of the current span, so the lines for one slow request can be
+pulled out of a busy log. LOG_FORMAT picks `json` (the default, one object
+per line) or `text`.
+
+Info and debug lines are sampled per request: LOG_SAMPLE_RATE is the share
+of requests whose lines are kept, overridden per route template by
+LOG_SAMPLE_RATES (for example `/api/chat=0.1,/api/chat/batch=1`). Health
+probes and /metrics are never logged. Warnings and errors are always kept.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Union
+
+from opentelemetry import trace
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Whether info and debug lines for the current request are kept
+log_sampled: ContextVar[Union[bool, "RouteSampling"]] = ContextVar("log_sampled", default=True)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Routes that are polled and never worth a log line
+QUIET_ROUTES = ("/", "/ready", "/test-auth", "/metrics")
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any extra= fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request and trace ids, and drops unsampled info lines."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not log_sampled.get():
+            return False
+        record.request_id = request_id.get()
+        span_context = trace.get_current_span().get_span_context()
+        record.trace_id = format(span_context.trace_id, "032x") if span_context.trace_id else None
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """Queues records unformatted and drops them, rather than block, when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record can travel as is
+        # and be formatted on the background thread. Render the traceback
+        # now, while the frames it refers to are still current.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a background queue, configured by the LOG_* settings."""
+    if os.environ.get("LOG_FORMAT", "json") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", "10000")))
+    handler = BackgroundQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse `route=rate,route=rate` into a dict."""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            route, rate = item.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+class RouteSampling:
+    """A request's sampling decision, made when its first info line is logged.
+
+    The route template is only known once the router has matched the request
+    and set scope["route"], which happens after the middleware has passed it
+    on, so the rate is looked up then. Lines logged before routing go by the
+    raw path and leave the decision open.
+    """
+
+    __slots__ = ("scope", "rates", "default", "sampled")
+
+    def __init__(self, scope, rates: Dict[str, float], default: float):
+        self.scope = scope
+        self.rates = rates
+        self.default = default
+        self.sampled: Optional[bool] = None
+
+    def __bool__(self) -> bool:
+        if self.sampled is not None:
+            return self.sampled
+        route = self.scope.get("route")
+        rate = self.rates.get(getattr(route, "path", self.scope["path"]), self.default)
+        sampled = rate >= 1 or random.random() < rate
+        if route is not None:
+            self.sampled = sampled
+        return sampled
+
+
+class RequestContextMiddleware:
+    """ASGI middleware that assigns request ids and makes the per-request sampling decision."""
+
+    def __init__(self, app, sample_rate: Optional[float] = None, sample_rates: Optional[Dict[str, float]] = None):
+        self.app = app
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+        self.sample_rate = sample_rate
+        self.sample_rates = {route: 0.0 for route in QUIET_ROUTES}
+        self.sample_rates.update(sample_rates)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for key, value in scope["headers"]:
+            if key == b"x-request-id":
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex
+        id_token = request_id.set(rid)
+        sampled_token = log_sampled.set(RouteSampling(scope, self.sample_rates, self.sample_rate))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(id_token)
+            log_sampled.reset(sampled_token)
+
@@ -0,0 +1,157 @@
+"""
+Retries, hedging and a retry budget for Gemini calls.
+
+Only transient failures are retried (timeouts, 429, 5xx), with exponential
+backoff and full jitter, and never past the call's overall deadline. Each
+retry spends a token from a RetryBudget that is refilled by a fraction of
+ordinary calls, so during an outage retries add at most that fraction to the
+load instead of multiplying it.
+
+With hedging on, a call that has not finished after the recent p95 latency
+gets a second, identical request; whichever succeeds first wins and the
+other is cancelled. Hedges spend retry budget too.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+import httpx
+
+from lazy import lazy_module
+from limiter import Overloaded
+
+errors = lazy_module("google.genai.errors")
+
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for failures that a later attempt may not hit."""
+    if isinstance(error, Overloaded):
+        # Our own queue turning the call away will not change on retry
+        return error.upstream
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError))
+
+
+class RetryBudget:
+    """Token bucket: every call earns `ratio` tokens, every retry or hedge costs one.
+
+    The bucket starts full, so a quiet server can still retry its first few
+    failures; under sustained failure retries settle at `ratio` of calls.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = float(max_tokens)
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Recent call latencies, for the hedging delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class RetryPolicy:
+    """Runs a call with retries, an overall deadline and optional hedging."""
+
+    def __init__(self, budget: RetryBudget, max_attempts: int = 3, base_delay: float = 0.2,
+                 max_delay: float = 2.0, deadline: float = 30.0, hedge: bool = False,
+                 hedge_percentile: float = 0.95):
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.latency = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], hedge: Optional[bool] = None) -> Any:
+        """Await fn() until it succeeds, fails for good or the deadline passes."""
+        self.budget.deposit()
+        give_up_at = time.monotonic() + self.deadline
+        attempt = 1
+        while True:
+            remaining = give_up_at - time.monotonic()
+            try:
+                return await asyncio.wait_for(self._attempt(fn, self.hedge if hedge is None else hedge), remaining)
+            except Exception as e:
+                if time.monotonic() >= give_up_at:
+                    raise asyncio.TimeoutError(f"Gemini call did not finish within {self.deadline:g}s") from e
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                # Full jitter: a random wait up to the exponential backoff
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if time.monotonic() + delay >= give_up_at or not self.budget.withdraw():
+                    raise
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_tokens": round(self.budget.tokens, 1),
+            "budget_exhausted": self.budget.exhausted,
+        }
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], hedge: bool) -> Any:
+        start = time.monotonic()
+        hedge_delay = self.latency.percentile(self.hedge_percentile) if hedge else None
+        primary = asyncio.ensure_future(fn())
+        tasks = {primary}
+        try:
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self.budget.withdraw():
+                    self.hedges += 1
+                    tasks.add(asyncio.ensure_future(fn()))
+
+            # Take the first success; fail only once every request has failed
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        self.latency.record(time.monotonic() - start)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
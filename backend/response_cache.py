@@ -0,0 +1,116 @@
+"""
+Exact-match response cache.
+
+Many users ask Grace the same product questions, and each one used to cost a
+model call plus a Vertex AI Search lookup. Responses are cached under a hash
+of the normalised conversation and the config profile that produced them.
+The in-memory tier is an LRU with a TTL; an optional SQLite tier keeps
+entries across restarts and shares them between workers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from lazy import lazy_module
+
+types = lazy_module("google.genai.types")
+
+
+def normalise(text: str) -> str:
+    """Case- and whitespace-insensitive form of a message."""
+    return " ".join(text.lower().split())
+
+
+def cache_key(contents: List[types.Content], profile: str) -> str:
+    """Hash of the normalised conversation plus the config profile."""
+    digest = hashlib.blake2b(profile.encode(), digest_size=16)
+    for content in contents:
+        digest.update(b"\x1e" + (content.role or "").encode() + b"\x1f")
+        for part in content.parts or []:
+            if part.text:
+                digest.update(normalise(part.text).encode())
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of responses, with an optional on-disk tier."""
+
+    def __init__(self, model: Type[BaseModel], max_entries: int = 1000, ttl_seconds: float = 3600,
+                 db_path: Optional[str] = None):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires at, response), oldest use first
+        self._entries: "OrderedDict[str, Tuple[float, BaseModel]]" = OrderedDict()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, body TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);"
+            )
+            self._db_lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[BaseModel]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        if self._conn is not None:
+            row = await asyncio.to_thread(self._read, key)
+            if row is not None:
+                response = self.model.model_validate_json(row[1])
+                self._remember(key, row[0], response)
+                self.hits += 1
+                return response
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, response: BaseModel):
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, expires_at, response)
+        if self._conn is not None:
+            await asyncio.to_thread(self._write, key, expires_at, response.model_dump_json())
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _remember(self, key: str, expires_at: float, response: BaseModel):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT expires_at, body FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+
+    def _write(self, key: str, expires_at: float, body: str):
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, expires_at, body) VALUES (?, ?, ?)",
+                (key, expires_at, body),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
@@ -0,0 +1,136 @@
+"""
+Answer text and citations from Gemini responses.
+
+Vertex AI Search puts its sources in the candidate's grounding_metadata:
+grounding_chunks are the retrieved documents, and grounding_supports map
+segments of the answer to the chunks that support them. Sources the model
+recites from are in citation_metadata. Segment offsets are passed through as
+Vertex reports them: UTF-8 byte offsets into the whole answer text.
+
+ResponseParser reads a unary response and the chunks of a stream the same
+way. feed() returns a chunk's text, joined in one pass. citations() returns
+one Citation per source in order of first appearance, however many chunks
+mention it, with each segment it supports.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+from pydantic import BaseModel, TypeAdapter
+
+
+class Segment(BaseModel):
+    start_index: int
+    end_index: int
+
+
+class Citation(BaseModel):
+    title: str
+    uri: str
+    # Parts of the answer this source supports
+    segments: List[Segment] = []
+
+
+_citation_list = TypeAdapter(List[Citation])
+
+
+class _Source:
+    __slots__ = ("title", "uri", "segments")
+
+    def __init__(self, title: str, uri: str):
+        self.title = title
+        self.uri = uri
+        # Insertion-ordered set of (start, end)
+        self.segments: Dict[Tuple[int, int], None] = {}
+
+
+class ResponseParser:
+    """Accumulates the text and sources of one response, streamed or not."""
+
+    def __init__(self):
+        self._text: List[str] = []
+        self._sources: Dict[str, _Source] = {}
+        # Supports refer to chunks by index into the latest grounding_chunks
+        self._chunks: List[_Source] = []
+
+    def feed(self, response) -> str:
+        """Take in a response or stream chunk and return its text."""
+        candidates = response.candidates if response is not None else None
+        if not candidates:
+            return ""
+        candidate = candidates[0]
+        text = ""
+        content = candidate.content
+        if content is not None and content.parts:
+            text = "".join([part.text for part in content.parts if part.text and not part.thought])
+            if text:
+                self._text.append(text)
+        if candidate.grounding_metadata is not None:
+            self._add_grounding(candidate.grounding_metadata)
+        if candidate.citation_metadata is not None and candidate.citation_metadata.citations:
+            for citation in candidate.citation_metadata.citations:
+                source = self._source(citation.title, citation.uri)
+                if citation.end_index is not None:
+                    source.segments[(citation.start_index or 0, citation.end_index)] = None
+        return text
+
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def citations(self) -> List[Citation]:
+        # One validation call builds every Citation and Segment, much faster
+        # than constructing a thousand Segments one by one
+        return _citation_list.validate_python([
+            {
+                "title": source.title,
+                "uri": source.uri,
+                "segments": [{"start_index": start, "end_index": end} for start, end in source.segments],
+            }
+            for source in self._sources.values()
+        ])
+
+    def _add_grounding(self, metadata):
+        if metadata.grounding_chunks:
+            self._chunks = [self._chunk_source(chunk) for chunk in metadata.grounding_chunks]
+        if not metadata.grounding_supports:
+            return
+        chunks = self._chunks
+        for support in metadata.grounding_supports:
+            segment = support.segment
+            if segment is None or not support.grounding_chunk_indices:
+                continue
+            # Zero offsets are left out on the wire
+            span = (segment.start_index or 0, segment.end_index or 0)
+            for index in support.grounding_chunk_indices:
+                if index < len(chunks):
+                    chunks[index].segments[span] = None
+
+    def _chunk_source(self, chunk) -> _Source:
+        context = chunk.retrieved_context or chunk.web
+        if context is None:
+            # Not a kind of source we can link to; supports for it are dropped
+            return _Source("Source", "#")
+        return self._source(context.title, context.uri)
+
+    def _source(self, title, uri) -> _Source:
+        title = title or "Source"
+        uri = uri or "#"
+        key = uri if uri != "#" else title
+        source = self._sources.get(key)
+        if source is None:
+            source = self._sources[key] = _Source(title, uri)
+        return source
+
+
+def parse_response(response) -> Tuple[str, List[Citation]]:
+    """The answer text and citations of a unary response."""
+    parser = ResponseParser()
+    parser.feed(response)
+    return parser.text(), parser.citations()
+
+
+def parse_stream(chunks: Sequence) -> Tuple[str, List[Citation]]:
+    """The answer text and citations of a complete list of stream chunks."""
+    parser = ResponseParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.text(), parser.citations()
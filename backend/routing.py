@@ -0,0 +1,163 @@
+"""
+Latency-aware routing across Gemini regions and model variants.
+
+Each Target is one model in one region, using the client created for that
+region at startup. The Router keeps a peak EWMA of each target's latency
+(a slower call counts in full at once, faster ones decay it over time) and a
+time-decayed error rate. Calls are spread over the targets scoring within a
+tolerance of the best, and fail over to the next best when a target returns a
+regional error (5xx, 429, timeout).
+
+Scores only learn from calls, so a target that stops getting them would keep
+its old peak forever. While a target sits idle its latency therefore decays
+toward the best target's and its error rate toward zero, at the same rate
+samples are blended in. A region that was slow, or failing, is tried again
+within a few decay periods and wins its traffic back if it has recovered; if
+not, its next call puts the peak straight back. A small share of calls also
+explores the other targets at random.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import random
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from gemini_config import get_config
+from lazy import lazy_module
+
+types = lazy_module("google.genai.types")
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Target:
+    """One model in one region, with its client and optional context cache."""
+
+    def __init__(self, location: str, model: str, client, context_cache=None):
+        self.location = location
+        self.model = model
+        self.client = client
+        self.context_cache = context_cache
+        self.name = f"{location}/{model}"
+        # Peak EWMA of call latency in seconds; None until the first call
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.updated_at = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def get_config(self, profile: str) -> types.GenerateContentConfig:
+        if self.context_cache is not None:
+            return self.context_cache.get_config(profile)
+        return get_config(profile)
+
+    def stats(self):
+        return {
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+class Router:
+    """Picks the target with the lowest error-weighted EWMA latency."""
+
+    def __init__(self, targets: List[Target], decay_seconds: float = 2.0, error_penalty: float = 10.0,
+                 tolerance: float = 0.5, explore: float = 0.05):
+        self.targets = targets
+        self.decay_seconds = decay_seconds
+        self.error_penalty = error_penalty
+        self.tolerance = tolerance
+        self.explore = explore
+        self.failovers = 0
+
+    def score(self, target: Target, now: Optional[float] = None, best: Optional[float] = None) -> float:
+        # Untried targets score 0, so each gets tried once before settling
+        if target.latency is None:
+            return 0.0
+        latency, error_rate = self._decayed(target, time.monotonic() if now is None else now,
+                                            self._best_latency() if best is None else best)
+        return latency * (1 + self.error_penalty * error_rate)
+
+    def ranked(self) -> List[Target]:
+        """Targets in the order a call should try them."""
+        now = time.monotonic()
+        best = self._best_latency()
+        scores = {target.name: self.score(target, now, best) for target in self.targets}
+        ranked = sorted(self.targets, key=lambda target: scores[target.name])
+        if len(ranked) < 2:
+            return ranked
+        # Spread calls over the targets about as good as the best, so equally
+        # healthy regions share the load instead of one taking all of it
+        cutoff = scores[ranked[0].name] * (1 + self.tolerance)
+        close = sum(1 for target in ranked if scores[target.name] <= cutoff)
+        if random.random() < self.explore:
+            first = random.randrange(len(ranked))
+        else:
+            first = random.randrange(close)
+        ranked.insert(0, ranked.pop(first))
+        return ranked
+
+    def record(self, target: Target, seconds: float, failed: bool):
+        now = time.monotonic()
+        # Weigh each sample by the time since the last one, so a target that
+        # only gets the odd exploratory call still catches up quickly
+        weight = 1 - math.exp(-(now - target.updated_at) / self.decay_seconds)
+        if target.latency is not None:
+            target.latency, target.error_rate = self._decayed(target, now, self._best_latency())
+        target.updated_at = now
+        target.calls += 1
+        target.errors += failed
+        target.error_rate += weight * (failed - target.error_rate)
+        if target.latency is None or seconds > target.latency:
+            # Peak EWMA: jump straight up to a slower sample, decay down
+            target.latency = seconds
+        elif not failed:
+            target.latency += weight * (seconds - target.latency)
+
+    def _best_latency(self) -> Optional[float]:
+        latencies = [target.latency for target in self.targets if target.latency is not None]
+        return min(latencies) if latencies else None
+
+    def _decayed(self, target: Target, now: float, best: Optional[float]) -> Tuple[float, float]:
+        """Latency and error rate after decaying over the time since the last call."""
+        idle = 1 - math.exp(-max(now - target.updated_at, 0.0) / self.decay_seconds)
+        latency = target.latency
+        if best is not None and latency > best:
+            latency -= idle * (latency - best)
+        return latency, target.error_rate * (1 - idle)
+
+    async def call(self, fn: Callable[[Target], Awaitable[T]],
+                   is_regional_error: Callable[[BaseException], bool]) -> T:
+        """Await fn(target) on the best target, failing over on regional errors."""
+        ranked = self.ranked()
+        for index, target in enumerate(ranked):
+            start = time.monotonic()
+            try:
+                result = await fn(target)
+            except Exception as e:
+                # Errors such as a bad request would fail anywhere; they say
+                # nothing about this target
+                if not is_regional_error(e):
+                    raise
+                self.record(target, time.monotonic() - start, failed=True)
+                if index == len(ranked) - 1:
+                    raise
+                self.failovers += 1
+                logger.warning("Gemini call to %s failed, trying %s: %s", target.name, ranked[index + 1].name, e)
+                continue
+            self.record(target, time.monotonic() - start, failed=False)
+            return result
+        raise RuntimeError("No Gemini targets are configured")
+
+    def stats(self):
+        return {
+            "failovers": self.failovers,
+            "targets": {target.name: target.stats() for target in self.targets},
+        }
@@ -0,0 +1,137 @@
+"""
+Semantic response cache for near-duplicate questions.
+
+Paraphrases of the same question ("what is CKP", "tell me about the Coredge
+Kubernetes Platform") miss the exact-match cache. Here the question is
+embedded and compared by cosine similarity against the embeddings of earlier
+questions; above a threshold the earlier answer is reused.
+
+Only opening questions are cached: once a conversation has history, the same
+words can mean something different, so those turns always go to the model.
+
+Embedders are pluggable. GeminiEmbedder calls the Vertex embedding model;
+HashingEmbedder is a deterministic local embedder for tests and benchmarks.
+"""
+
+from __future__ import annotations
+
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from lazy import lazy_module
+from response_cache import normalise
+
+types = lazy_module("google.genai.types")
+
+
+class Embedder(ABC):
+    """Turns texts into L2-normalised float32 vectors of a fixed dimension."""
+
+    dimensions: int
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """One row per text."""
+
+
+class GeminiEmbedder(Embedder):
+    """Embeds with a Vertex AI text embedding model."""
+
+    def __init__(self, client, model: str = "text-embedding-005", dimensions: int = 256):
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        # Built on first use, so creating an embedder does not import the SDK
+        self._config: Optional[types.EmbedContentConfig] = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if self._config is None:
+            self._config = types.EmbedContentConfig(
+                task_type="SEMANTIC_SIMILARITY",
+                output_dimensionality=self.dimensions,
+            )
+        response = await self.client.aio.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=self._config,
+        )
+        vectors = np.array([embedding.values for embedding in response.embeddings], dtype=np.float32)
+        return _normalise_rows(vectors)
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic local embedder: hashed words and character trigrams."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f" {normalise(text)} "
+            features = padded.split() + [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for feature in features:
+                digest = zlib.crc32(feature.encode())
+                sign = 1.0 if digest & 1 else -1.0
+                vectors[row, (digest >> 1) % self.dimensions] += sign
+        return _normalise_rows(vectors)
+
+
+def _normalise_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over question embeddings.
+
+    Embeddings live in one preallocated matrix, so a lookup is a single
+    matrix-vector product. When full, the oldest entry is overwritten.
+    """
+
+    def __init__(self, embedder: Embedder, threshold: float = 0.92, max_entries: int = 10000,
+                 ttl_seconds: float = 3600):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._matrix = np.zeros((max_entries, embedder.dimensions), dtype=np.float32)
+        self._responses: List[Optional[Tuple[float, BaseModel]]] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+
+    async def embed(self, question: str) -> np.ndarray:
+        return (await self.embedder.embed([question]))[0]
+
+    def lookup(self, vector: np.ndarray) -> Optional[BaseModel]:
+        """Return the cached answer to the most similar earlier question, if close enough."""
+        if self._size:
+            scores = self._matrix[:self._size] @ vector
+            best = int(np.argmax(scores))
+            entry = self._responses[best]
+            if scores[best] >= self.threshold and entry is not None and entry[0] > time.time():
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, vector: np.ndarray, response: BaseModel):
+        slot = self._next
+        self._matrix[slot] = vector
+        self._responses[slot] = (time.time() + self.ttl_seconds, response)
+        self._next = (slot + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self._size}
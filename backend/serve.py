@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Launch the backend in development or production mode.
+
+dev:  one process with auto-reload and plain-text logs, for local work.
+prod: WEB_CONCURRENCY worker processes (default: the CPUs this container may
+      use), uvloop and httptools when installed, tuned keep-alive and listen
+      backlog, no per-request access log, and a graceful drain on SIGTERM:
+      the server stops accepting connections and gives in-flight requests
+      and streams GRACEFUL_TIMEOUT seconds to finish before exiting.
+
+Usage:
+    python serve.py [--mode dev|prod] [--app app:app] [--workers N]
+
+Settings (flags override them): SERVER_MODE (default prod), HOST, PORT,
+WEB_CONCURRENCY, KEEP_ALIVE (seconds, default 75), BACKLOG (default 2048),
+GRACEFUL_TIMEOUT (seconds, default 30).
+"""
+
+import argparse
+import importlib.util
+import logging
+import math
+import os
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring CPU affinity and a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("dev", "prod"), default=os.environ.get("SERVER_MODE", "prod"))
+    parser.add_argument("--app", default="app:app", help="ASGI app to serve, as module:attribute")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "0")) or available_cpus())
+    parser.add_argument("--keep-alive", type=int, default=int(os.environ.get("KEEP_ALIVE", "75")),
+                        help="seconds to hold an idle connection; keep above the load balancer's idle timeout")
+    parser.add_argument("--backlog", type=int, default=int(os.environ.get("BACKLOG", "2048")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("GRACEFUL_TIMEOUT", "30")))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.mode == "dev":
+        os.environ.setdefault("LOG_FORMAT", "text")
+        logger.info("Starting %s in dev mode on %s:%d with reload", args.app, args.host, args.port)
+        uvicorn.run(args.app, host=args.host, port=args.port, reload=True)
+        return
+
+    if args.workers > 1 and os.environ.setdefault("SESSION_STORE", "sqlite") == "memory":
+        # Each worker would have its own sessions, and most turns would 404
+        logger.warning("SESSION_STORE=memory with %d workers: sessions are not shared between them", args.workers)
+    loop = "uvloop" if installed("uvloop") else "asyncio"
+    http = "httptools" if installed("httptools") else "h11"
+    logger.info("Starting %s in prod mode on %s:%d with %d workers (%s, %s)",
+                args.app, args.host, args.port, args.workers, loop, http)
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        # Requests are logged by the app, sampled and off the event loop
+        access_log=False,
+        # Leave uvicorn's loggers to propagate into the app's JSON logging
+        log_config=None,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Server-side conversation sessions.
+
+Keeps each conversation's history as ready-to-send Gemini Content objects so
+a client only uploads the new message on every turn instead of replaying the
+whole transcript. Two backends implement the SessionStore interface:
+
+- MemorySessionStore: in-process LRU, bounded in size, idle sessions expire
+  after a TTL. Fastest, but lost on restart and private to one worker.
+- SQLiteSessionStore: SQLite in WAL mode, shared by every worker on the host
+  and durable across restarts. Messages are stored as append-only rows, so a
+  turn never rewrites the transcript.
+
+Pick one with create_session_store(), driven by SESSION_STORE.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from history import text_content
+from lazy import lazy_module
+
+types = lazy_module("google.genai.types")
+
+
+class SessionStore(ABC):
+    """Interface for session backends.
+
+    Histories are lists of Gemini Content. The list returned by get() is
+    shared with the store and must not be mutated; use append() instead.
+    """
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @abstractmethod
+    async def create(self, contents: Optional[List[types.Content]] = None) -> str:
+        """Start a session, optionally with some history, and return its id."""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[List[types.Content]]:
+        """Return the history and mark the session used, or None if unknown or expired."""
+
+    @abstractmethod
+    async def append(self, session_id: str, contents: List[types.Content]):
+        """Add contents to the end of the session's history."""
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        """Forget the session; unknown ids are ignored."""
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Lock that serialises the turns of one session within this worker."""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+
+class MemorySessionStore(SessionStore):
+    """In-process session store with LRU size bound and idle TTL."""
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        # session id -> (last access, history), ordered by last access, oldest first
+        self._sessions: "OrderedDict[str, Tuple[float, List[types.Content]]]" = OrderedDict()
+
+    async def create(self, contents: Optional[List[types.Content]] = None) -> str:
+        self._evict()
+        session_id = uuid.uuid4().hex
+        self._sessions[session_id] = (time.monotonic(), list(contents or []))
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[List[types.Content]]:
+        self._evict()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        self._sessions[session_id] = (time.monotonic(), entry[1])
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    async def append(self, session_id: str, contents: List[types.Content]):
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            entry[1].extend(contents)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        # Expired sessions are always at the front, so stop at the first live one
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            last_access, _ = next(iter(self._sessions.values()))
+            if last_access > cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+
+# Roles are stored as small integers to keep rows compact
+_ROLE_CODES = {"user": 0, "model": 1}
+_ROLE_NAMES = {code: role for role, code in _ROLE_CODES.items()}
+
+_MESSAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role INTEGER NOT NULL,
+    text TEXT NOT NULL
+)"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+""" + _MESSAGES_TABLE + """;
+CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq);
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite (WAL) session store shared by all workers on a host.
+
+    Each message is one row keyed by an increasing sequence number, which
+    AUTOINCREMENT guarantees is never reused, even after the rows holding
+    the highest numbers are deleted. Every
+    worker keeps the histories it has recently served, together with the
+    highest sequence number it has seen, so a turn only reads the rows other
+    workers have added since. Database calls run in a worker thread to keep
+    the event loop free.
+    """
+
+    def __init__(self, path: str = "sessions.db", max_sessions: int = 10000,
+                 ttl_seconds: float = 3600, cache_size: int = 1000):
+        super().__init__()
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._next_evict = 0.0
+        # session id -> (last seq seen, history)
+        self._cache: "OrderedDict[str, Tuple[int, List[types.Content]]]" = OrderedDict()
+
+    async def create(self, contents: Optional[List[types.Content]] = None) -> str:
+        session_id = uuid.uuid4().hex
+        contents = list(contents or [])
+        last_seq = await asyncio.to_thread(self._create, session_id, contents)
+        self._remember(session_id, last_seq, contents)
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[List[types.Content]]:
+        cached = self._cache.get(session_id)
+        after_seq = cached[0] if cached is not None else -1
+        rows = await asyncio.to_thread(self._touch_and_read, session_id, after_seq)
+        if rows is None:
+            self._cache.pop(session_id, None)
+            return None
+        if cached is not None and not rows:
+            self._cache.move_to_end(session_id)
+            return cached[1]
+        # Cached lists are never mutated in place, so build a new one
+        history = list(cached[1]) if cached is not None else []
+        last_seq = after_seq
+        for seq, role, text in rows:
+            history.append(_to_content(role, text))
+            last_seq = seq
+        self._remember(session_id, last_seq, history)
+        return history
+
+    async def append(self, session_id: str, contents: List[types.Content]):
+        cached = self._cache.get(session_id)
+        after_seq = cached[0] if cached is not None else -1
+        last_seq, up_to_date = await asyncio.to_thread(self._append, session_id, contents, after_seq)
+        # Only extend our copy if no other worker appended in between
+        if cached is not None and up_to_date:
+            self._remember(session_id, last_seq, cached[1] + list(contents))
+        else:
+            self._cache.pop(session_id, None)
+
+    async def delete(self, session_id: str):
+        self._cache.pop(session_id, None)
+        await asyncio.to_thread(self._delete, [session_id])
+
+    def close(self):
+        self._conn.close()
+
+    def _remember(self, session_id: str, last_seq: int, history: List[types.Content]):
+        self._cache[session_id] = (last_seq, history)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _create(self, session_id: str, contents: List[types.Content]) -> int:
+        with self._db_lock:
+            self._evict()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (id, last_access) VALUES (?, ?)", (session_id, time.time())
+                )
+                last_seq = self._insert_messages(session_id, contents)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return last_seq
+
+    def _touch_and_read(self, session_id: str, after_seq: int) -> Optional[List[Tuple[int, int, str]]]:
+        with self._db_lock:
+            updated = self._conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE id = ? AND last_access >= ?",
+                (time.time(), session_id, time.time() - self.ttl_seconds),
+            ).rowcount
+            if not updated:
+                return None
+            return self._conn.execute(
+                "SELECT seq, role, text FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, after_seq),
+            ).fetchall()
+
+    def _append(self, session_id: str, contents: List[types.Content], after_seq: int) -> Tuple[int, bool]:
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Don't leave orphaned rows behind for a session that was evicted
+                if self._conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is None:
+                    self._conn.execute("ROLLBACK")
+                    return after_seq, False
+                missed = self._conn.execute(
+                    "SELECT 1 FROM messages WHERE session_id = ? AND seq > ? LIMIT 1", (session_id, after_seq)
+                ).fetchone()
+                last_seq = self._insert_messages(session_id, contents)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return last_seq, missed is None
+
+    def _insert_messages(self, session_id: str, contents: List[types.Content]) -> int:
+        """Insert the messages and return the last sequence number, or 0 if there were none.
+
+        0 is below every real number, so a new empty session's cache picks up
+        whatever another worker appends to it.
+        """
+        last_seq = 0
+        for content in contents:
+            last_seq = self._conn.execute(
+                "INSERT INTO messages (session_id, role, text) VALUES (?, ?, ?)",
+                (session_id, _ROLE_CODES.get(content.role, 0), _content_text(content)),
+            ).lastrowid
+        return last_seq
+
+    def _migrate(self):
+        # Databases from before AUTOINCREMENT could hand out a deleted
+        # session's sequence numbers again; copy them into the new table
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+            ).fetchone()
+            if row is not None and "AUTOINCREMENT" not in row[0].upper():
+                self._conn.execute("DROP INDEX IF EXISTS messages_session")
+                self._conn.execute("ALTER TABLE messages RENAME TO messages_old")
+                self._conn.execute(_MESSAGES_TABLE)
+                self._conn.execute("INSERT INTO messages SELECT seq, session_id, role, text FROM messages_old")
+                self._conn.execute("DROP TABLE messages_old")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _delete(self, session_ids: List[str]):
+        with self._db_lock:
+            self._delete_locked(session_ids)
+
+    def _delete_locked(self, session_ids: List[str]):
+        if not session_ids:
+            return
+        placeholders = ",".join("?" * len(session_ids))
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(f"DELETE FROM messages WHERE session_id IN ({placeholders})", session_ids)
+            self._conn.execute(f"DELETE FROM sessions WHERE id IN ({placeholders})", session_ids)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self):
+        # Counting sessions scans the table, so sweep at most once a second
+        now = time.monotonic()
+        if now < self._next_evict:
+            return
+        self._next_evict = now + 1.0
+        # Drop expired sessions, then the least recently used ones over the size bound
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT id FROM sessions WHERE last_access < ?", (time.time() - self.ttl_seconds,)
+        )]
+        self._delete_locked(expired)
+        count = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        if count >= self.max_sessions:
+            oldest = [row[0] for row in self._conn.execute(
+                "SELECT id FROM sessions ORDER BY last_access LIMIT ?", (count - self.max_sessions + 1,)
+            )]
+            self._delete_locked(oldest)
+
+
+def _content_text(content: types.Content) -> str:
+    return "".join(part.text for part in content.parts or [] if part.text)
+
+
+def _to_content(role: int, text: str) -> types.Content:
+    return text_content(_ROLE_NAMES.get(role, "user"), text)
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by the SESSION_* environment variables."""
+    backend = os.environ.get("SESSION_STORE", "memory")
+    max_sessions = int(os.environ.get("SESSION_MAX_SESSIONS", "10000"))
+    ttl_seconds = int(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            path=os.environ.get("SESSION_DB_PATH", "sessions.db"),
+            max_sessions=max_sessions,
+            ttl_seconds=ttl_seconds,
+        )
+    if backend == "memory":
+        return MemorySessionStore(max_sessions=max_sessions, ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
@@ -0,0 +1,128 @@
+"""
+OpenTelemetry tracing for the backend.
+
+The frontend sends a W3C `traceparent` header with each chat request.
+TracingMiddleware continues that trace with a server span per request, so a
+slow answer can be followed from the browser's fetch through the handler,
+history conversion, retrieval and each Gemini call. Responses carry the
+trace id in `X-Trace-Id`.
+
+TRACING_EXPORTER selects where finished spans go:
+    none     tracing off (the default); spans are no-ops, but the caller's
+             trace id is still passed through
+    console  printed to stdout
+    file     appended as JSON lines to TRACING_FILE, for tests and local runs
+    otlp     sent over OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT
+TRACING_SAMPLE_RATIO samples a share of new traces; a sampled parent from
+the frontend is always followed.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Optional, Sequence
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("grace")
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends each finished span to a file as one line of JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+        with self._lock, open(self.path, "a") as file:
+            file.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def create_exporter(name: str) -> SpanExporter:
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter(os.environ.get("TRACING_FILE", "traces.jsonl"))
+    if name == "otlp":
+        # Imported here so the exporter's protobuf stack only loads when used
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {name!r}; use none, console, file or otlp")
+
+
+def setup_tracing() -> Optional[TracerProvider]:
+    """Install the tracer provider configured by the TRACING_* settings."""
+    exporter = os.environ.get("TRACING_EXPORTER", "none")
+    if exporter == "none":
+        return None
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": os.environ.get("OTEL_SERVICE_NAME", "grace-backend")}),
+        sampler=ParentBased(TraceIdRatioBased(float(os.environ.get("TRACING_SAMPLE_RATIO", "1.0")))),
+    )
+    provider.add_span_processor(BatchSpanProcessor(create_exporter(exporter)))
+    trace.set_tracer_provider(provider)
+    logger.info("Exporting traces to %s", exporter)
+    return provider
+
+
+def record_exception(span: trace.Span, error: BaseException):
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+
+class TracingMiddleware:
+    """ASGI middleware that continues the caller's trace with a server span per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(headers),
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": scope["method"], "url.path": scope["path"]},
+        ) as span:
+            trace_id = span.get_span_context().trace_id
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                    if trace_id:
+                        header = (b"x-trace-id", format(trace_id, "032x").encode())
+                        message["headers"] = list(message.get("headers", [])) + [header]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                # Name the span by route template once routing has matched
+                route = scope.get("route")
+                if route is not None:
+                    span.update_name(f"{scope['method']} {route.path}")
+                    span.set_attribute("http.route", route.path)
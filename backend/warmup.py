@@ -0,0 +1,98 @@
+"""
+Background warm-up and readiness.
+
+The slow parts of startup (importing the Google SDK, loading credentials and
+fetching an access token, opening a connection to each region) run as a
+background task once the server is listening, instead of at import time or
+on the first user's request. Until every required step has finished the
+process is live but not ready: health checks answer at once, and requests
+that need Gemini wait for the warm-up for a bounded time.
+
+Steps run in order. A failing required step stops the warm-up and leaves the
+process unready; a failing optional step (a connection pre-open, say) is
+logged and skipped, since requests will simply do that work themselves.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[], Awaitable[None]]
+
+
+class Warmup:
+    """Runs startup steps in the background and reports readiness."""
+
+    def __init__(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.durations: Dict[str, float] = {}
+        self._steps: List[Tuple[str, Step, bool]] = []
+        self._created = time.perf_counter()
+        self._ready_after: Optional[float] = None
+        self._done = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def step(self, name: str, required: bool = True) -> Callable[[Step], Step]:
+        """Decorator adding an async step, run after the ones added before it."""
+        def register(fn: Step) -> Step:
+            self._steps.append((name, fn, required))
+            return fn
+        return register
+
+    def start(self):
+        """Start the warm-up if it is not already running or done."""
+        if self._task is None:
+            # A fresh context, so the first request's id and log sampling
+            # decision do not follow the warm-up's own log lines
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for the warm-up to finish; True if ready."""
+        self.start()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    async def _run(self):
+        try:
+            for name, fn, required in self._steps:
+                start = time.perf_counter()
+                try:
+                    await fn()
+                except Exception as e:
+                    if required:
+                        self.error = f"{name}: {e}"
+                        logger.exception("Warm-up step %s failed: %s", name, e)
+                        return
+                    logger.warning("Optional warm-up step %s failed: %s", name, e)
+                finally:
+                    self.durations[name] = time.perf_counter() - start
+            self.ready = True
+            self._ready_after = time.perf_counter() - self._created
+            logger.info("Ready after %.2fs (%s)", self._ready_after,
+                        ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.durations.items()))
+        finally:
+            self._done.set()
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "ready_after_s": round(self._ready_after, 3) if self._ready_after is not None else None,
+            "steps_ms": {name: round(seconds * 1000, 1) for name, seconds in self.durations.items()},
+        }
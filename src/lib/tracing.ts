@@ -0,0 +1,20 @@
+// W3C trace context for backend requests, so a slow answer can be followed
+// from this fetch through the backend's spans and logs.
+// See https://www.w3.org/TR/trace-context/#traceparent-header
+
+const randomHex = (bytes: number) =>
+  Array.from(crypto.getRandomValues(new Uint8Array(bytes)), (b) => b.toString(16).padStart(2, '0')).join('');
+
+export interface Trace {
+  traceId: string;
+  headers: () => Record<string, string>;
+}
+
+// One trace per user message; each request in it gets its own parent span id
+export function startTrace(): Trace {
+  const traceId = randomHex(16);
+  return {
+    traceId,
+    headers: () => ({ traceparent: `00-${traceId}-${randomHex(8)}-01` }),
+  };
+}
@@ -5,6 +5,7 @@ import ChatInput from '@/components/ChatInput';
 import SuggestionChip from '@/components/SuggestionChip';
 import { toast } from 'sonner';
 import { cn } from '@/lib/utils';
+import { startTrace, type Trace } from '@/lib/tracing';
 
 interface Message {
   id: string;
@@ -34,9 +35,46 @@ const suggestedQuestions = [
 
 // API configuration
 // Use the VM's API endpoint
-const API_URL = "http://34.45.129.121:8000/api/chat";
+const SESSIONS_URL = "http://34.45.129.121:8000/api/sessions";
 const HEALTH_URL = "http://34.45.129.121:8000/";
 
+// Read a Server-Sent Events response and hand each parsed event to the callback
+const readEventStream = async (
+  response: Response,
+  onEvent: (event: string, data: any) => void
+) => {
+  const reader = response.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+          data += line.slice(5).trim();
+        }
+      }
+      if (data) {
+        onEvent(event, JSON.parse(data));
+      }
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+};
+
 const Index = () => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [isTyping, setIsTyping] = useState(false);
@@ -44,6 +82,8 @@ const Index = () => {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const chatContainerRef = useRef<HTMLDivElement>(null);
   const [isTransitioning, setIsTransitioning] = useState(false);
+  // The backend keeps the conversation history; we only send new messages
+  const sessionIdRef = useRef<string | null>(null);
   
   // Check if API is available on component mount
   useEffect(() => {
@@ -73,7 +113,40 @@ const Index = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages, isTyping]);
 
-  const sendMessageToAPI = async (userMessage: string) => {
+  // Start a server-side session, seeded with whatever transcript we already have
+  const createSession = async (trace: Trace) => {
+    const response = await fetch(SESSIONS_URL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...trace.headers(),
+      },
+      body: JSON.stringify({
+        messages: messages.map(msg => ({
+          role: msg.isUser ? 'user' : 'assistant',
+          content: msg.content
+        }))
+      }),
+    });
+    if (!response.ok) {
+      throw new Error(`Session request failed with status ${response.status}`);
+    }
+    const data = await response.json();
+    return data.session_id as string;
+  };
+
+  const busyReply = (retryAfter: string | null) => {
+    toast.error('Grace is busy right now.');
+    return {
+      text: `I'm handling a lot of questions right now. Please try again in ${retryAfter || 'a few'} seconds.`,
+      citations: []
+    };
+  };
+
+  const sendMessageToAPI = async (
+    userMessage: string,
+    onDelta: (textSoFar: string) => void
+  ) => {
     if (!isApiAvailable) {
       toast.error('Backend service is not available. Please make sure it\'s running.');
       return {
@@ -82,37 +155,48 @@ const Index = () => {
       };
     }
     
+    const trace = startTrace();
+    const startedAt = performance.now();
     try {
-      console.log('Sending message to API:', userMessage);
-      console.log('API URL:', API_URL);
-      
-      // Format the messages as required by our FastAPI endpoint
-      const formattedMessages = messages.map(msg => ({
-        role: msg.isUser ? 'user' : 'assistant',
-        content: msg.content
-      }));
-      
-      // Add the current message to the conversation
-      formattedMessages.push({
-        role: 'user',
-        content: userMessage
-      });
+      console.log('Sending message to API:', userMessage, 'trace', trace.traceId);
       
       // Show a more specific loading toast to indicate API call is in progress
       toast.info('Waiting for AI response...');
       
-      const response = await fetch(API_URL, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          messages: formattedMessages
-        }),
-      });
+      const postMessage = async () => {
+        if (!sessionIdRef.current) {
+          sessionIdRef.current = await createSession(trace);
+        }
+        const url = `${SESSIONS_URL}/${sessionIdRef.current}/messages/stream`;
+        console.log('API URL:', url);
+        return fetch(url, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+            ...trace.headers(),
+          },
+          body: JSON.stringify({
+            content: userMessage
+          }),
+        });
+      };
+      
+      let response = await postMessage();
+      
+      // The session may have expired on the server; start a fresh one from our transcript
+      if (response.status === 404) {
+        sessionIdRef.current = null;
+        response = await postMessage();
+      }
 
       console.log('API response status:', response.status);
       
+      // The backend is saturated; retrying elsewhere would only add load
+      if (response.status === 429 || response.status === 503) {
+        return busyReply(response.headers.get('Retry-After'));
+      }
+      
       // If API returns error status but has a specific response, we might be able to use it
       if (!response.ok) {
         const errorText = await response.text();
@@ -135,16 +219,36 @@ const Index = () => {
         throw new Error(`API request failed with status ${response.status}`);
       }
 
-      const data = await response.json();
-      console.log('API response data:', data);
+      // Render text deltas as they arrive; citations come in the final event
+      let text = '';
+      let citations: Array<{title: string, uri: string}> = [];
+      let retryAfter: string | null = null;
+      await readEventStream(response, (event, data) => {
+        if (event === 'delta') {
+          text += data.text;
+          onDelta(text);
+        } else if (event === 'done') {
+          citations = data.citations || [];
+        } else if (event === 'error') {
+          if (data.retry_after) {
+            retryAfter = String(data.retry_after);
+            return;
+          }
+          throw new Error(data.detail);
+        }
+      });
+      if (retryAfter !== null) {
+        return busyReply(retryAfter);
+      }
+      console.log('API stream finished with', citations.length, 'citations in',
+        Math.round(performance.now() - startedAt), 'ms, trace', trace.traceId);
       
-      // Return the response with citations if available
       return {
-        text: data.response,
-        citations: data.citations || []
+        text,
+        citations
       };
     } catch (error) {
-      console.error('Error sending message to API:', error);
+      console.error('Error sending message to API:', error, 'trace', trace.traceId);
       toast.error('Failed to get a response from the AI.');
       
       // Try a direct fallback to simplified chat if the main endpoint failed
@@ -190,25 +294,31 @@ const Index = () => {
     setMessages(prev => [...prev, newMessage]);
     setIsTyping(true);
 
+    // The assistant reply is added on the first streamed chunk and updated in place
+    const replyId = `${newMessage.id}-reply`;
+    const upsertReply = (reply: Omit<Message, 'id' | 'isUser'>) => {
+      setMessages(prev => prev.some(msg => msg.id === replyId)
+        ? prev.map(msg => msg.id === replyId ? { ...msg, ...reply } : msg)
+        : [...prev, { id: replyId, isUser: false, ...reply }]);
+    };
+
     try {
-      // Send to API and get response
-      const apiResponse = await sendMessageToAPI(message);
+      // Send to API and stream the response into the chat
+      const apiResponse = await sendMessageToAPI(message, (textSoFar) => {
+        upsertReply({ content: textSoFar });
+      });
       
-      setMessages(prev => [...prev, {
-        id: Date.now().toString(),
+      upsertReply({
         content: apiResponse.text,
-        isUser: false,
         citations: apiResponse.citations
-      }]);
+      });
     } catch (error) {
       console.error('Error in handling message:', error);
       
       // Add an error message to the chat if something went wrong
-      setMessages(prev => [...prev, {
-        id: Date.now().toString(),
-        content: "I'm sorry, there was an error processing your request. Please try again later.",
-        isUser: false
-      }]);
+      upsertReply({
+        content: "I'm sorry, there was an error processing your request. Please try again later."
+      });
     } finally {
       setIsTyping(false);
     }
@@ -291,7 +401,7 @@ const Index = () => {
                 />
               ))}
               
-              {isTyping && (
+              {isTyping && messages[messages.length - 1]?.isUser && (
                 <ChatMessage
                   content=""
                   isLoading={true}